@@ -3,7 +3,7 @@ from flask import Flask
 from config import Config
 from extensions import init_extensions
 from routes import register_blueprints
-from routes.export import start_backup_scheduler 
+from scheduler import start_scheduler
 
 def create_app():
     app = Flask(__name__)
@@ -12,7 +12,7 @@ def create_app():
     init_extensions(app)
     register_blueprints(app)
 
-    start_backup_scheduler() 
+    start_scheduler()
 
     return app
 
@@ -0,0 +1,499 @@
+#backups.py
+"""
+Native backups (no mongodump), kept in a content-addressed chunk store.
+
+    BACKUP_ROOT/chunks/ab/<sha256>.bson.gz   gzip of consecutive BSON docs (~CHUNK_DOCS)
+    BACKUP_ROOT/snapshots/<id>.json          manifest referencing chunks
+
+A chunk is addressed by the SHA-256 of its uncompressed BSON, so a chunk that
+another snapshot already wrote is reused instead of stored again; collections
+that never change (asset_types, users) cost nothing after the first backup.
+Collections are read in _id order and a chunk ends after every doc whose _id
+hashes to a boundary (content-defined chunking on the key), so boundaries do
+not depend on position: inserting, updating or deleting a doc only changes
+the chunk it falls in, not every chunk after it.
+
+Manifest:
+    {id, type: full|incremental, base, created_at, since,
+     collections: {name: {mode: full|delta, count, chunks: [{hash, count, bytes}],
+                          ids_chunks, indexes}}}
+
+Full snapshots dump every collection. Incremental snapshots dump only the
+documents of INCREMENTAL_COLLECTIONS whose `updated_at` is newer than the
+previous snapshot (assets get `updated_at` from utils.stamp_updated whenever
+their content changes), plus the list of all current _ids so deletions can be replayed; the
+small collections are always dumped in full.
+
+restore_snapshot() replays a chain (last full snapshot, then each incremental
+on top of it) into a staging database, collections in parallel, builds the
+indexes after loading and then renames each collection over the live one.
+The rename step is per collection, not atomic; its progress is recorded so
+an interrupted swap can be finished (resume_restore). A restore also marks
+the next backup as full: restored docs keep their old `updated_at`, so a
+delta on top of the pre-restore chain would miss them.
+
+prune_backups() applies the retention policy (newest snapshot per day for
+BACKUP_KEEP_DAILY days, per week for BACKUP_KEEP_WEEKLY weeks, plus the bases
+they need) and deletes chunks no remaining snapshot references.
+"""
+import gzip
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from bson import encode, decode_file_iter
+from pymongo import ReplaceOne
+
+from config import Config
+from models import db
+
+BACKUP_ROOT = os.path.abspath("mongo_backups")
+CHUNK_DIR = os.path.join(BACKUP_ROOT, "chunks")
+SNAPSHOT_DIR = os.path.join(BACKUP_ROOT, "snapshots")
+DB_NAME = db.name
+# collection -> field maintained by every write path
+INCREMENTAL_COLLECTIONS = {"assets": "updated_at"}
+# Never backed up or restored: transient state, live cache versions / restore state
+# (app_meta) and the scheduler, whose next_run_at and history must not rewind
+EXCLUDED_COLLECTIONS = {"import_previews", "import_preview_rows", "jobs", "app_meta",
+                        "schedules", "schedule_runs", "scheduler_lease"}
+# Take a fresh full snapshot after this many incrementals
+MAX_CHAIN_LENGTH = 6
+CHUNK_DOCS = 1000          # average docs per chunk
+MAX_CHUNK_DOCS = CHUNK_DOCS * 4
+BATCH_SIZE = 1000
+RESTORE_WORKERS = Config.RESTORE_WORKERS
+KEEP_DAILY = Config.BACKUP_KEEP_DAILY
+KEEP_WEEKLY = Config.BACKUP_KEEP_WEEKLY
+# Chunks touched this recently are never collected (a backup may be writing its manifest)
+GC_GRACE = timedelta(hours=6)
+RESTORE_STATE_ID = "restore_in_progress"
+FORCE_FULL_ID = "backup_force_full"   # app_meta: set by a restore, cleared by the next full backup
+
+
+def is_chunk_boundary(doc):
+    """True for ~1 in CHUNK_DOCS docs, decided by the _id alone."""
+    digest = hashlib.blake2b(encode({"_id": doc["_id"]}), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % CHUNK_DOCS == 0
+
+
+def iter_chunks(docs):
+    """Split an _id-ordered doc stream at _id-defined boundaries (capped at MAX_CHUNK_DOCS)."""
+    chunk = []
+    for doc in docs:
+        chunk.append(doc)
+        if is_chunk_boundary(doc) or len(chunk) >= MAX_CHUNK_DOCS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _batches(docs, size):
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- Chunk store -----------------------------------------------------------------
+def chunk_path(chunk_hash):
+    return os.path.join(CHUNK_DIR, chunk_hash[:2], f"{chunk_hash}.bson.gz")
+
+
+def write_chunks(docs, stats):
+    """
+    Store documents as content-addressed chunks. Returns the chunk refs;
+    stats["chunks_written"] / ["chunks_reused"] / ["bytes_written"] are updated.
+    """
+    refs = []
+    for batch in iter_chunks(docs):
+        raw = b"".join(encode(doc) for doc in batch)
+        chunk_hash = hashlib.sha256(raw).hexdigest()
+        path = chunk_path(chunk_hash)
+        if os.path.exists(path):
+            os.utime(path)  # keeps it inside GC_GRACE until our manifest is written
+            stats["chunks_reused"] += 1
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as fh:
+                fh.write(gzip.compress(raw, compresslevel=6))
+            os.replace(tmp, path)
+            stats["chunks_written"] += 1
+            stats["bytes_written"] += os.path.getsize(path)
+        refs.append({"hash": chunk_hash, "count": len(batch), "bytes": os.path.getsize(path)})
+    return refs
+
+
+def read_chunk(chunk_hash, verify=True):
+    """Raw BSON of a chunk; raises ValueError if it is missing or corrupt."""
+    path = chunk_path(chunk_hash)
+    if not os.path.exists(path):
+        raise ValueError(f"chunk {chunk_hash} is missing")
+    with open(path, "rb") as fh:
+        raw = gzip.decompress(fh.read())
+    if verify and hashlib.sha256(raw).hexdigest() != chunk_hash:
+        raise ValueError(f"chunk {chunk_hash} failed its checksum")
+    return raw
+
+
+def iter_chunk_docs(refs):
+    """Yield the documents stored in a list of chunk refs, in order."""
+    for ref in refs:
+        yield from decode_file_iter(BytesIO(read_chunk(ref["hash"], verify=False)))
+
+
+def backup_collections():
+    return sorted(n for n in db.list_collection_names()
+                  if n not in EXCLUDED_COLLECTIONS and not n.startswith("system."))
+
+
+def collection_indexes(name):
+    """Index specs (minus _id_) in a form create_index() accepts back."""
+    specs = []
+    for index_name, info in db[name].index_information().items():
+        if index_name == "_id_":
+            continue
+        options = {k: v for k, v in info.items() if k not in ("key", "v", "ns")}
+        options["name"] = index_name
+        specs.append({"key": [list(k) for k in info["key"]], "options": options})
+    return specs
+
+
+# --- Snapshots -------------------------------------------------------------------
+def manifest_path(snapshot_id):
+    return os.path.join(SNAPSHOT_DIR, f"{snapshot_id}.json")
+
+
+def load_manifest(snapshot_id):
+    if not snapshot_id or not os.path.exists(manifest_path(snapshot_id)):
+        return None
+    with open(manifest_path(snapshot_id), encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def list_snapshots():
+    """Manifests of all complete snapshots, oldest first."""
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return []
+    manifests = [load_manifest(name[:-5]) for name in os.listdir(SNAPSHOT_DIR) if name.endswith(".json")]
+    return sorted((m for m in manifests if m), key=lambda m: m["created_at"])
+
+
+def snapshot_chain(snapshot_id):
+    """[full, incremental, ...] manifests needed to restore `snapshot_id`."""
+    chain = []
+    manifest = load_manifest(snapshot_id)
+    while manifest:
+        chain.append(manifest)
+        if manifest["type"] == "full":
+            return list(reversed(chain))
+        manifest = load_manifest(manifest["base"])
+    raise ValueError(f"Snapshot chain for {snapshot_id} is broken (missing base)")
+
+
+def snapshot_chunks(manifest):
+    """Every chunk hash a snapshot references (its own, not its base's)."""
+    hashes = set()
+    for entry in manifest["collections"].values():
+        for ref in entry["chunks"] + entry.get("ids_chunks", []):
+            hashes.add(ref["hash"])
+    return hashes
+
+
+def _choose_type(kind, snapshots, force_full=False):
+    if force_full:
+        return "full"
+    if kind in ("full", "incremental") and not (kind == "incremental" and not snapshots):
+        return kind
+    if not snapshots:
+        return "full"
+    chain_length = 0
+    for manifest in reversed(snapshots):
+        if manifest["type"] == "full":
+            break
+        chain_length += 1
+    return "full" if chain_length >= MAX_CHAIN_LENGTH else "incremental"
+
+
+def create_backup(kind="auto", progress=None):
+    """
+    Write a snapshot. kind: "full", "incremental" or "auto" (incremental on top
+    of the latest snapshot unless the chain is already MAX_CHAIN_LENGTH long).
+    `progress(done, total, message)` is called per collection. Returns the manifest.
+    """
+    snapshots = list_snapshots()
+    force_full = db["app_meta"].find_one({"_id": FORCE_FULL_ID})
+    snapshot_type = _choose_type(kind, snapshots, force_full=bool(force_full))
+    if force_full and kind == "incremental":
+        print(f"⚠️ Taking a full backup instead: the database was restored from {force_full.get('snapshot')}")
+    base = snapshots[-1] if snapshot_type == "incremental" else None
+
+    started_at = datetime.utcnow()
+    snapshot_id = f"{DB_NAME}_{started_at.strftime('%Y%m%d_%H%M%S')}_{snapshot_type}"
+    manifest = {
+        "id": snapshot_id,
+        "type": snapshot_type,
+        "base": base["id"] if base else None,
+        "db": DB_NAME,
+        "created_at": started_at.isoformat(),
+        # Deltas cover writes since the base *started*, so nothing in flight is lost
+        "since": base["created_at"] if base else None,
+        "collections": {},
+    }
+    since = datetime.fromisoformat(base["created_at"]) if base else None
+    stats = {"chunks_written": 0, "chunks_reused": 0, "bytes_written": 0}
+    names = backup_collections()
+    t0 = time.monotonic()
+
+    for i, name in enumerate(names):
+        if progress:
+            progress(i, len(names), f"Backing up {name}")
+        manifest["collections"][name] = _dump_collection(name, since, stats)
+
+    manifest["stats"] = stats
+    manifest["seconds"] = round(time.monotonic() - t0, 2)
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp = manifest_path(snapshot_id) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=2)
+    os.replace(tmp, manifest_path(snapshot_id))
+    if force_full:
+        db["app_meta"].delete_one({"_id": FORCE_FULL_ID})
+
+    docs = sum(c["count"] for c in manifest["collections"].values())
+    print(f"✅ Backup {snapshot_id}: {docs} docs, {stats['chunks_written']} new / "
+          f"{stats['chunks_reused']} reused chunks ({stats['bytes_written'] / 1024 / 1024:.1f} MB) in {manifest['seconds']}s")
+    return manifest
+
+
+def _dump_collection(name, since, stats):
+    collection = db[name]
+    entry = {"indexes": collection_indexes(name)}
+    tracked_field = INCREMENTAL_COLLECTIONS.get(name)
+
+    if since is not None and tracked_field:
+        entry["mode"] = "delta"
+        query = {tracked_field: {"$gte": since}}
+        entry["chunks"] = write_chunks(collection.find(query).sort("_id", 1).batch_size(BATCH_SIZE), stats)
+        # Every live _id, so deletions since the base can be replayed
+        entry["ids_chunks"] = write_chunks(
+            collection.find({}, {"_id": 1}).sort("_id", 1).batch_size(BATCH_SIZE * 10), stats)
+    else:
+        entry["mode"] = "full"
+        entry["chunks"] = write_chunks(collection.find().sort("_id", 1).batch_size(BATCH_SIZE), stats)
+
+    entry["count"] = sum(ref["count"] for ref in entry["chunks"])
+    return entry
+
+
+def verify_snapshot(snapshot_id, checked=None):
+    """
+    Check that every chunk of a snapshot exists and matches its hash. Returns a
+    list of problems. Pass a shared `checked` set to skip chunks already verified.
+    """
+    manifest = load_manifest(snapshot_id)
+    if not manifest:
+        return [f"{snapshot_id}: manifest missing"]
+    checked = set() if checked is None else checked
+    problems = []
+    for chunk_hash in sorted(snapshot_chunks(manifest) - checked):
+        try:
+            read_chunk(chunk_hash)
+            checked.add(chunk_hash)
+        except (ValueError, OSError) as e:
+            problems.append(f"{snapshot_id}: {e}")
+    return problems
+
+
+# --- Retention -------------------------------------------------------------------
+def retained_snapshots(snapshots, now=None, keep_daily=KEEP_DAILY, keep_weekly=KEEP_WEEKLY):
+    """Ids to keep: the newest per day / per ISO week inside the windows, the latest, and their bases."""
+    now = now or datetime.utcnow()
+    by_id = {m["id"]: m for m in snapshots}
+    keep, days, weeks = set(), set(), set()
+    for manifest in sorted(snapshots, key=lambda m: m["created_at"], reverse=True):
+        created = datetime.fromisoformat(manifest["created_at"])
+        day, week = created.date(), created.isocalendar()[:2]
+        if created >= now - timedelta(days=keep_daily) and day not in days:
+            days.add(day)
+            keep.add(manifest["id"])
+        if created >= now - timedelta(weeks=keep_weekly) and week not in weeks:
+            weeks.add(week)
+            keep.add(manifest["id"])
+    if snapshots:
+        keep.add(snapshots[-1]["id"])
+
+    # An incremental is useless without the snapshots under it
+    for snapshot_id in list(keep):
+        base = by_id[snapshot_id].get("base")
+        while base and base in by_id and base not in keep:
+            keep.add(base)
+            base = by_id[base].get("base")
+    return keep
+
+
+def prune_backups(dry_run=False):
+    """Drop snapshots outside the retention policy, then unreferenced chunks. Returns a summary."""
+    snapshots = list_snapshots()
+    keep = retained_snapshots(snapshots)
+    expired = [m for m in snapshots if m["id"] not in keep]
+    referenced = set()
+    for manifest in snapshots:
+        if manifest["id"] in keep:
+            referenced |= snapshot_chunks(manifest)
+
+    if not dry_run:
+        for manifest in expired:
+            os.remove(manifest_path(manifest["id"]))
+
+    cutoff = time.time() - GC_GRACE.total_seconds()
+    removed_chunks, freed = 0, 0
+    for root, _dirs, files in os.walk(CHUNK_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                if name.split(".", 1)[0] in referenced or os.path.getmtime(path) >= cutoff:
+                    continue
+                size = os.path.getsize(path)
+                if not dry_run:
+                    os.remove(path)
+            except OSError:
+                continue
+            removed_chunks += 1
+            freed += size
+
+    print(f"🧹 Backups: kept {len(keep)} snapshots, removed {len(expired)}; "
+          f"{removed_chunks} chunks ({freed / 1024 / 1024:.1f} MB) collected{' [dry run]' if dry_run else ''}")
+    return {"kept": len(keep), "removed": [m["id"] for m in expired],
+            "chunks_removed": removed_chunks, "bytes_freed": freed}
+
+
+# --- Restore ---------------------------------------------------------------------
+def _collection_plan(chain, name):
+    """Entries to replay for one collection: its last full dump, then later deltas."""
+    plan = []
+    for manifest in chain:
+        entry = manifest["collections"].get(name)
+        if not entry:
+            continue
+        if entry["mode"] == "full":
+            plan = []
+        plan.append(entry)
+    return plan
+
+
+def _restore_collection(target, name, plan):
+    collection = target.create_collection(name)
+    for entry in plan:
+        for batch in _batches(iter_chunk_docs(entry["chunks"]), BATCH_SIZE):
+            if entry["mode"] == "full":
+                collection.insert_many(batch, ordered=False)
+            else:
+                collection.bulk_write([ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in batch], ordered=False)
+
+    # The newest delta lists every live _id; anything else was deleted after the base
+    entry = plan[-1]
+    if entry.get("ids_chunks"):
+        live = {d["_id"] for d in iter_chunk_docs(entry["ids_chunks"])}
+        gone = [d["_id"] for d in collection.find({}, {"_id": 1}) if d["_id"] not in live]
+        for batch in _batches(gone, BATCH_SIZE):
+            collection.delete_many({"_id": {"$in": batch}})
+
+    # Indexes last: one build over loaded data beats per-insert maintenance
+    for spec in entry["indexes"]:
+        collection.create_index([tuple(k) for k in spec["key"]], **spec["options"])
+    return collection.estimated_document_count()
+
+
+def _swap_in(client, staging_name, names):
+    """
+    Rename staged collections over the live ones, one at a time. This is NOT
+    atomic across collections: MongoDB has no multi-collection rename. The
+    pending list is kept in app_meta so an interrupted swap is finished by
+    resume_restore() (and leaves the staging database in place until then).
+    """
+    app_meta = db["app_meta"]
+    app_meta.update_one({"_id": RESTORE_STATE_ID},
+                        {"$set": {"staging": staging_name, "pending": list(names), "started_at": datetime.utcnow()}},
+                        upsert=True)
+    for name in names:
+        client.admin.command("renameCollection", f"{staging_name}.{name}",
+                             to=f"{DB_NAME}.{name}", dropTarget=True)
+        app_meta.update_one({"_id": RESTORE_STATE_ID}, {"$pull": {"pending": name}})
+    client.drop_database(staging_name)
+    app_meta.delete_one({"_id": RESTORE_STATE_ID})
+
+
+def resume_restore():
+    """Finish a swap that was interrupted part-way. Returns the collections swapped, or None."""
+    state = db["app_meta"].find_one({"_id": RESTORE_STATE_ID})
+    if not state:
+        return None
+    client = db.client
+    staged = set(client[state["staging"]].list_collection_names())
+    # A pending name missing from staging was renamed just before the crash
+    pending = [n for n in state["pending"] if n in staged]
+    print(f"⚠️ Finishing interrupted restore from {state['staging']}: {len(pending)} collections left")
+    _swap_in(client, state["staging"], pending)
+    return pending
+
+
+def restore_snapshot(snapshot_id=None, progress=None, workers=RESTORE_WORKERS):
+    """
+    Restore `snapshot_id` (default: the latest) with its base chain. Checksums
+    are verified first; collections load into a staging database in parallel
+    and are then renamed over the live ones (see _swap_in: per collection, not
+    atomic; an interrupted swap is resumed first). Returns {snapshot, collections, seconds}.
+    """
+    resume_restore()
+    if snapshot_id is None:
+        snapshots = list_snapshots()
+        if not snapshots:
+            raise ValueError("No backups found")
+        snapshot_id = snapshots[-1]["id"]
+    chain = snapshot_chain(snapshot_id)
+    t0 = time.monotonic()
+
+    checked = set()
+    problems = [p for manifest in chain for p in verify_snapshot(manifest["id"], checked)]
+    if problems:
+        raise ValueError("Backup failed verification: " + "; ".join(problems[:5]))
+
+    client = db.client
+    staging_name = f"{DB_NAME}_restore_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+    staging = client[staging_name]
+    names = sorted(n for n in chain[-1]["collections"] if n not in EXCLUDED_COLLECTIONS)
+    counts = {}
+
+    # A failed load leaves the live database untouched
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ams-restore") as pool:
+            futures = {name: pool.submit(_restore_collection, staging, name, _collection_plan(chain, name))
+                       for name in names}
+            for i, name in enumerate(names):
+                counts[name] = futures[name].result()
+                if progress:
+                    progress(i + 1, len(names), f"Restored {name}")
+    except BaseException:
+        client.drop_database(staging_name)
+        raise
+
+    # Before the swap, so even a half-finished one is followed by a full backup
+    db["app_meta"].update_one({"_id": FORCE_FULL_ID},
+                              {"$set": {"snapshot": snapshot_id, "restored_at": datetime.utcnow()}},
+                              upsert=True)
+    _swap_in(client, staging_name, names)
+
+    seconds = round(time.monotonic() - t0, 2)
+    print(f"✅ Restored {snapshot_id} ({sum(counts.values())} docs, {len(names)} collections) in {seconds}s")
+    return {"snapshot": snapshot_id, "collections": counts, "seconds": seconds}
@@ -11,3 +11,15 @@ class Config:
     SESSION_COOKIE_HTTPONLY = True       # JS can't access it
     SESSION_COOKIE_SAMESITE = 'Lax'      # Prevent CSRF via cross-site requests
     PERMANENT_SESSION_LIFETIME = timedelta(minutes=30)  # Session expires after 30 mins
+
+    # ⏳ Background jobs (imports, exports, backups)
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_RESULTS_DIR = os.environ.get('JOB_RESULTS_DIR', 'job_results')   # shared storage when running >1 instance
+    RESTORE_WORKERS = int(os.environ.get('RESTORE_WORKERS', 4))     # collections restored in parallel
+    BACKUP_KEEP_DAILY = int(os.environ.get('BACKUP_KEEP_DAILY', 7))     # newest backup per day, for N days
+    BACKUP_KEEP_WEEKLY = int(os.environ.get('BACKUP_KEEP_WEEKLY', 8))   # newest backup per week, for N weeks
+
+    # 🗜️ Response compression (gzip, or brotli when the brotli package is installed)
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))                   # gzip 1-9
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))  # brotli 0-11
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))          # bytes; smaller bodies go out as-is
@@ -0,0 +1,613 @@
+#exporters.py
+"""
+Streaming asset exports.
+
+Builders read assets from a batched Mongo cursor and write straight to a file
+object, so memory stays flat regardless of fleet size. Routes (and background
+jobs) write into a temp file and hand it to file_stream_response(), which sends
+it in chunks and deletes it afterwards.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+import zlib
+from datetime import datetime, date
+
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from flask import Response
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, NamedStyle
+from openpyxl.utils import get_column_letter
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = pq = None
+
+from jobs import job_task
+from models import assets_collection
+from type_registry import get_asset_type
+from utils import INTERNAL_FIELDS, DERIVED_FIELDS, to_bson_date, to_money, format_date
+
+EXPORT_BATCH_SIZE = 1000
+STREAM_CHUNK_SIZE = 64 * 1024
+COLUMN_WIDTH = 25
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+# --- Shared helpers ---------------------------------------------------------
+def ids_query(ids_param):
+    """`?ids=a,b,c` from the bulk-selection modal -> Mongo query ({} = everything)."""
+    if not ids_param:
+        return {}
+    ids = [ObjectId(i) for i in ids_param.split(",") if i]
+    return {"_id": {"$in": ids}}
+
+
+def iter_assets(query, sort=None, batch_size=EXPORT_BATCH_SIZE):
+    """Batched cursor over assets without the derived search/sort fields."""
+    cursor = assets_collection.find(query, {f: 0 for f in DERIVED_FIELDS}).batch_size(batch_size)
+    if sort:
+        cursor = cursor.sort(sort)
+    return cursor
+
+
+def write_to_tempfile(builder, *args, suffix=""):
+    """Run builder(fileobj, *args) into a named temp file; returns its path."""
+    fd, path = tempfile.mkstemp(prefix="ams_export_", suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            builder(fh, *args)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def iter_file_chunks(path, chunk_size=STREAM_CHUNK_SIZE, delete=True):
+    try:
+        with open(path, "rb") as fh:
+            while True:
+                chunk = fh.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if delete:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def file_stream_response(path, filename, mimetype, delete=True):
+    """Chunked attachment response for a file on disk (deleted once sent)."""
+    response = Response(iter_file_chunks(path, delete=delete), mimetype=mimetype, direct_passthrough=True)
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response.headers["Content-Length"] = str(os.path.getsize(path))
+    return response
+
+
+def normalize_gst_key(key):
+    if not key:
+        return key
+    if key.startswith("gst_"):
+        return key.replace("(", "").replace(")", "").replace("%", "")
+    return key
+
+
+def gst_label(name):
+    try:
+        return f"GST ({name.split('_')[1]}%)"
+    except Exception:
+        return "GST"
+
+
+def get_fields(asset_type, sample=None):
+    """
+    Ordered export columns for a type: its schema fields, or (for types with no
+    schema) the keys of a sample asset.
+    """
+    doc = get_asset_type(asset_type)
+    if doc and "fields" in doc:
+        fields = []
+        for f in doc["fields"]:
+            name = normalize_gst_key(f.get("name") or "")
+            label = f.get("label") or ""
+            if name.startswith("gst_"):
+                label = gst_label(name)
+            fields.append({"label": label, "name": name, "type": f.get("type", "text")})
+        return fields
+
+    fields = []
+    for k in (normalize_gst_key(k) for k in (sample or {}).keys() if k not in INTERNAL_FIELDS):
+        if k.startswith("gst_"):
+            fields.append({"label": gst_label(k), "name": k, "type": "number"})
+        else:
+            fields.append({"label": k.replace("_", " ").title(), "name": k, "type": "text"})
+    return fields
+
+
+def is_currency_field(field):
+    name = (field.get("name") or "").lower()
+    label = (field.get("label") or "").lower()
+    type_ = (field.get("type") or "").lower()
+    return name in {"amount", "total"} or name.startswith("gst_") or label.startswith("gst") or type_ == "number" and ("amount" in name or "total" in name or "gst" in name)
+
+
+def coerce_number(val):
+    if val is None:
+        return None
+    if isinstance(val, Decimal128):
+        return float(val.to_decimal())
+    if isinstance(val, (int, float)):
+        return float(val)
+    s = str(val).strip()
+    if not s:
+        return None
+    s = s.replace("₹", "").replace(",", "").replace(" ", "")
+    try:
+        return float(s)
+    except Exception:
+        return None
+
+
+def asset_category(asset):
+    return str(asset.get("category") or "Unknown").strip()
+
+
+# --- Excel (one sheet per asset type) ----------------------------------------
+def _excel_styles():
+    header = NamedStyle(name="ams_header")
+    header.font = Font(bold=True, color="FFFFFF", name="Calibri")
+    header.fill = PatternFill(start_color="043251", end_color="043251", fill_type="solid")
+    header.alignment = Alignment(wrap_text=True, vertical="top")
+
+    cell = NamedStyle(name="ams_cell")
+    cell.font = Font(name="Calibri")
+    cell.alignment = Alignment(wrap_text=True, vertical="top")
+    return header, cell
+
+
+def excel_cell_value(field, normalized_asset):
+    key = field.get("name")
+    label = field.get("label")
+    dtype = (field.get("type") or "text").lower()
+
+    val = normalized_asset.get(key) or normalized_asset.get(label) or ""
+    if isinstance(val, (datetime, date)):
+        return format_date(val)
+    if dtype == "date" and val:
+        parsed = to_bson_date(val)
+        return format_date(parsed) if isinstance(parsed, datetime) else val
+    if is_currency_field(field):
+        num = coerce_number(val)
+        return num if num is not None else val
+    if isinstance(val, Decimal128):
+        return float(val.to_decimal())
+    return val
+
+
+def write_excel_export(fileobj, query, progress=None):
+    """
+    Write-only workbook, one sheet per asset type, fed by a cursor sorted on
+    category. Cells share two named styles instead of per-cell style objects.
+    `progress(rows_written)` is called once per cursor batch.
+    """
+    wb = Workbook(write_only=True)
+    for style in _excel_styles():
+        wb.add_named_style(style)
+
+    sheets = {}  # asset type -> (worksheet, fields)
+    for count, asset in enumerate(iter_assets(query, sort=[("category", 1), ("_id", 1)]), start=1):
+        if progress and count % EXPORT_BATCH_SIZE == 0:
+            progress(count)
+        asset_type = asset_category(asset)
+        if asset_type not in sheets:
+            fields = get_fields(asset_type, sample=asset)
+            if not fields:
+                sheets[asset_type] = (None, None)
+                continue
+            ws = wb.create_sheet(title=asset_type[:31])
+            for col in range(1, len(fields) + 1):
+                ws.column_dimensions[get_column_letter(col)].width = COLUMN_WIDTH
+            header_row = []
+            for f in fields:
+                cell = WriteOnlyCell(ws, value=f["label"])
+                cell.style = "ams_header"
+                header_row.append(cell)
+            ws.append(header_row)
+            sheets[asset_type] = (ws, fields)
+
+        ws, fields = sheets[asset_type]
+        if ws is None:
+            continue
+
+        normalized_asset = {normalize_gst_key(k): v for k, v in asset.items()}
+        row = []
+        for field in fields:
+            value = excel_cell_value(field, normalized_asset)
+            cell = WriteOnlyCell(ws, value=value)
+            cell.style = "ams_cell"
+            row.append(cell)
+        ws.append(row)
+
+    if not sheets:
+        # openpyxl refuses to save a workbook without sheets
+        wb.create_sheet(title="Assets")
+    wb.save(fileobj)
+
+
+# --- KEKA (single sheet, HR asset format) ------------------------------------
+# Each asset type maps the four type-specific KEKA columns to value getters.
+# Getters are built once from the profiles below; a row is then just a handful
+# of closure calls. Types without a profile use KEKA_DEFAULT_PROFILE, and a
+# profile only lists the columns it overrides.
+KEKA_HEADERS = [
+    "Asset ID", "Asset Name", "Asset Description", "Asset Location", "Asset Category",
+    "Asset Type", "Purchased On (dd-mmm-yyyy)", "Warranty Expires On (dd-mmm-yyyy)",
+    "Asset Condition", "Asset Status", "Reason, if Not Available",
+    "Employee Number, if Assigned", "Date of Asset Assignment (dd-mmm-yyyy)"
+]
+KEKA_PROFILE_COLUMNS = ("asset_id", "asset_name", "description", "location")
+KEKA_ASSET_CATEGORY = "IT assets"
+KEKA_DATE_FORMAT = "%d-%b-%Y"
+
+
+def first(*keys, default="-"):
+    """First non-blank value among keys."""
+    def get(asset):
+        for key in keys:
+            val = asset.get(key)
+            if val:
+                s = str(val).strip()
+                if s:
+                    return s
+        return default
+    return get
+
+
+def either(*getters, default="-"):
+    """First getter that yields something (getters should default to "")."""
+    def get(asset):
+        for getter in getters:
+            val = getter(asset)
+            if val:
+                return val
+        return default
+    return get
+
+
+def joined(sep, *parts, default="-"):
+    """Non-blank parts joined by sep; a part is a key or another getter."""
+    getters = [p if callable(p) else first(p, default="") for p in parts]
+
+    def get(asset):
+        return sep.join(v for v in (g(asset) for g in getters) if v) or default
+    return get
+
+
+def area_state(default="-"):
+    area, state = first("area", default=""), first("state", default="")
+
+    def get(asset):
+        a, s = area(asset), state(asset)
+        return f"{a} ({s})" if a and s else a or s or default
+    return get
+
+
+KEKA_DEFAULT_PROFILE = {
+    "asset_id": first("asset_tag", "endpoint_name", "serial_no", "mtr_asset_tag", "monitor_asset_tag", "cpu_asset_tag"),
+    "asset_name": first("category"),
+    "description": joined("  ", "model", "system_model", "ram", "storage"),
+    "location": area_state(),
+}
+
+# Keyed by lowercased category
+KEKA_PROFILES = {
+    "desktop": {
+        "asset_id": joined(", ", first("cpu_asset_tag", default="NA"), first("monitor_asset_tag", "mtr_asset_tag", default="NA")),
+    },
+    "laptop": {
+        "asset_id": first("user_code", "serial_no"),
+        "asset_name": either(joined(", ", "system_manufacturer", "system_model", default=""), first("category")),
+        "description": joined(", ", "processor", "ram", "os", "hdd_size", "free_space", "license"),
+        "location": either(first("endpoint_name", default=""), area_state()),
+    },
+    "franchise inv": {
+        "asset_id": first("user_code"),
+    },
+    "mobile": {
+        "asset_id": first("imei1", "imei2"),
+    },
+}
+
+# raw status -> (condition, status, reason if not available)
+KEKA_STATUS_MAP = {
+    "available(p)": ("poor", "available(p)", "-"),
+    "available(g)": ("good", "available(g)", "-"),
+    "assigned(p)": ("poor", "assigned(p)", "-"),
+    "assigned(g)": ("good", "assigned(g)", "-"),
+    "discard": ("-", "not available", "discard"),
+    "repair/faulty": ("-", "not available", "repair/faulty"),
+}
+
+
+def keka_date(val):
+    d = to_bson_date(val)
+    return d.strftime(KEKA_DATE_FORMAT) if isinstance(d, datetime) else "-"
+
+
+def keka_status(asset):
+    raw = str(asset.get("status") or "").strip().lower()
+    return KEKA_STATUS_MAP.get(raw) or ("-", raw or "-", "-")
+
+
+def keka_employee(asset):
+    username, user_code = str(asset.get("username") or "").strip(), str(asset.get("user_code") or "").strip()
+    if username and user_code:
+        return f"{username} ({user_code})"
+    return username or user_code or "-"
+
+
+def compile_keka_profile(profile):
+    """Profile dict -> build_row(asset) returning the KEKA_HEADERS values."""
+    spec = {**KEKA_DEFAULT_PROFILE, **profile}
+    asset_id, asset_name, description, location = (spec[c] for c in KEKA_PROFILE_COLUMNS)
+
+    def build_row(asset):
+        name = asset_name(asset)
+        condition, status, remarks = keka_status(asset)
+        return [
+            asset_id(asset),
+            name,
+            description(asset),
+            location(asset),
+            KEKA_ASSET_CATEGORY,
+            name,
+            keka_date(asset.get("purchase_date")),
+            "-",
+            condition,
+            status,
+            remarks,
+            keka_employee(asset),
+            keka_date(asset.get("given_date")),
+        ]
+    return build_row
+
+
+_keka_builders = {category: compile_keka_profile(p) for category, p in KEKA_PROFILES.items()}
+_keka_default_builder = compile_keka_profile({})
+
+
+def keka_row_builder(category):
+    return _keka_builders.get(str(category or "").strip().lower(), _keka_default_builder)
+
+
+def iter_keka_rows(query):
+    for asset in iter_assets(query):
+        yield keka_row_builder(asset.get("category"))(asset)
+
+
+def write_keka_export(fileobj, query, progress=None):
+    """Single 'KEKA Export' sheet in a write-only workbook."""
+    wb = Workbook(write_only=True)
+    header_style = NamedStyle(name="keka_header")
+    header_style.font = Font(bold=True, name="Calibri")
+    header_style.alignment = Alignment(wrap_text=True, vertical="top", horizontal="left")
+    cell_style = NamedStyle(name="keka_cell")
+    cell_style.alignment = Alignment(wrap_text=True, vertical="top", horizontal="left")
+    wb.add_named_style(header_style)
+    wb.add_named_style(cell_style)
+
+    ws = wb.create_sheet(title="KEKA Export")
+    for col in range(1, len(KEKA_HEADERS) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = COLUMN_WIDTH
+
+    def styled(values, style):
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(ws, value=value)
+            cell.style = style
+            cells.append(cell)
+        return cells
+
+    ws.append(styled(KEKA_HEADERS, "keka_header"))
+    for count, row in enumerate(iter_keka_rows(query), start=1):
+        ws.append(styled(row, "keka_cell"))
+        if progress and count % EXPORT_BATCH_SIZE == 0:
+            progress(count)
+    wb.save(fileobj)
+
+
+# --- CSV / NDJSON / Parquet (flat, one row per asset) ------------------------
+# Columns are `_id`, `category`, then every field of the exported types in the
+# same per-type order as the Excel sheets (first type to define a name wins).
+# Dates are written as ISO dates, money as plain decimals.
+LEAD_COLUMNS = ({"name": "_id", "label": "ID", "type": "text"}, {"name": "category", "label": "Category", "type": "text"})
+CSV_MIMETYPE = "text/csv"
+NDJSON_MIMETYPE = "application/x-ndjson"
+PARQUET_MIMETYPE = "application/vnd.apache.parquet"
+GZIP_MIMETYPE = "application/gzip"
+GZIP_LEVEL = 6
+
+
+def export_query(ids_param=None, asset_type=None):
+    query = ids_query(ids_param)
+    if asset_type:
+        query["category"] = asset_type
+    return query
+
+
+def export_columns(query):
+    """Union of get_fields() over the categories present in `query`, in order."""
+    columns, seen = list(LEAD_COLUMNS), {c["name"] for c in LEAD_COLUMNS}
+    for category in sorted(c for c in assets_collection.distinct("category", query) if c):
+        sample = None
+        if not get_asset_type(category):
+            sample = assets_collection.find_one({**query, "category": category}, {f: 0 for f in DERIVED_FIELDS})
+        for field in get_fields(str(category).strip(), sample=sample):
+            if field["name"] and field["name"] not in seen:
+                seen.add(field["name"])
+                columns.append(field)
+    return columns
+
+
+def flat_value(field, normalized_asset):
+    """Plain (JSON/CSV-safe) value for a column, None when blank."""
+    key = field["name"]
+    val = normalized_asset.get(key)
+    if val in (None, ""):
+        val = normalized_asset.get(field.get("label"))
+    if val in (None, ""):
+        return None
+    if key == "_id":
+        return str(val)
+    if (field.get("type") or "").lower() == "date" or isinstance(val, (datetime, date)):
+        parsed = to_bson_date(val)
+        return parsed.date().isoformat() if isinstance(parsed, datetime) else str(val)
+    if isinstance(val, Decimal128):
+        return str(val.to_decimal())
+    if is_currency_field(field):
+        money = to_money(val)
+        return str(money.to_decimal()) if money is not None else str(val)
+    if isinstance(val, (int, float, bool)):
+        return val
+    return str(val)
+
+
+def iter_flat_rows(query, columns):
+    for asset in iter_assets(query, sort=[("category", 1), ("_id", 1)]):
+        normalized_asset = {normalize_gst_key(k): v for k, v in asset.items()}
+        yield [flat_value(f, normalized_asset) for f in columns]
+
+
+def iter_csv(query, columns=None):
+    columns = columns or export_columns(query)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([c["name"] for c in columns])
+    for i, row in enumerate(iter_flat_rows(query, columns), start=1):
+        writer.writerow(["" if v is None else v for v in row])
+        if i % EXPORT_BATCH_SIZE == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def iter_ndjson(query, columns=None):
+    columns = columns or export_columns(query)
+    names = [c["name"] for c in columns]
+    lines = []
+    for row in iter_flat_rows(query, columns):
+        lines.append(json.dumps({n: v for n, v in zip(names, row) if v is not None}, ensure_ascii=False))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def gzip_chunks(chunks, level=GZIP_LEVEL):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def stream_response(chunks, filename, mimetype, gzip=False):
+    """Attachment response for a generator of byte chunks (optionally gzipped)."""
+    if gzip:
+        chunks, filename, mimetype = gzip_chunks(chunks), f"{filename}.gz", GZIP_MIMETYPE
+    response = Response(chunks, mimetype=mimetype, direct_passthrough=True)
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _parquet_schema(columns):
+    schema = []
+    for f in columns:
+        if (f.get("type") or "").lower() == "date":
+            schema.append(pa.field(f["name"], pa.date32()))
+        elif is_currency_field(f):
+            schema.append(pa.field(f["name"], pa.decimal128(18, 2)))
+        else:
+            schema.append(pa.field(f["name"], pa.string()))
+    return pa.schema(schema)
+
+
+def _parquet_value(pa_type, val):
+    if val is None:
+        return None
+    if pa.types.is_date32(pa_type):
+        try:
+            return date.fromisoformat(val)
+        except (TypeError, ValueError):
+            return None  # unparseable date text, not representable in a date column
+    if pa.types.is_decimal(pa_type):
+        money = to_money(val)
+        return money.to_decimal() if money is not None else None
+    return str(val)
+
+
+def write_parquet_export(fileobj, query, compression="snappy"):
+    """Typed columns (date32 / decimal(18,2) / string), one row group per cursor batch."""
+    if pa is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    columns = export_columns(query)
+    schema = _parquet_schema(columns)
+    types = [f.type for f in schema]
+
+    def flush(rows):
+        arrays = [pa.array([_parquet_value(t, r[i]) for r in rows], type=t) for i, t in enumerate(types)]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+    writer = pq.ParquetWriter(fileobj, schema, compression=compression)
+    try:
+        rows = []
+        for row in iter_flat_rows(query, columns):
+            rows.append(row)
+            if len(rows) >= EXPORT_BATCH_SIZE:
+                flush(rows)
+                rows = []
+        if rows:
+            flush(rows)
+    finally:
+        writer.close()
+
+
+# --- Background job tasks (see jobs.py) ---------------------------------------
+def _export_job(job, builder, ids, filename, label):
+    query = ids_query(ids)
+    total = assets_collection.count_documents(query)
+    job.progress(0, total, f"Exporting {total} assets")
+    path = job.result_path(".xlsx")
+    with open(path, "wb") as fh:
+        builder(fh, query, progress=lambda n: job.progress(n, total))
+    job.progress(total, total)
+    return {
+        "file": path,
+        "filename": filename,
+        "mimetype": XLSX_MIMETYPE,
+        "message": f"✅ {label} export ready ({total} assets).",
+    }
+
+
+@job_task("export_excel")
+def export_excel_job(job, ids=None):
+    filename = f"Asset_Export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return _export_job(job, write_excel_export, ids, filename, "Excel")
+
+
+@job_task("export_keka")
+def export_keka_job(job, ids=None):
+    filename = f"KEKA_Asset_Export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return _export_job(job, write_keka_export, ids, filename, "KEKA")
@@ -1,46 +1,29 @@
 # extensions.py
 
-from flask_wtf import CSRFProtect
 from flask import request, jsonify, redirect, url_for, session
 from flask_wtf.csrf import CSRFError
+from static_assets import init_static_assets, is_static_path
+from response_compression import init_compression
+from parsing import format_inr
+from csrf_masking import MaskedCSRFProtect, masked_csrf_token
 
-csrf = CSRFProtect()
-
-def format_inr(value):
-    """Format number into Indian currency style with rupee symbol."""
-    if value is None or value == "":
-        return "—"
-    try:
-        # Ensure float
-        value = float(str(value).replace(",", ""))
-        # Split integer and decimal
-        integer, dot, fraction = f"{value:.2f}".partition(".")
-        # Indian number system formatting
-        last3 = integer[-3:]
-        rest = integer[:-3]
-        if rest:
-            rest = ",".join(
-                [rest[max(i - 2, 0):i] for i in range(len(rest), 0, -2)][::-1]
-            )
-            formatted = rest + "," + last3
-        else:
-            formatted = last3
-        return f"₹{formatted}.{fraction}"
-    except Exception:
-        return str(value)
-
+csrf = MaskedCSRFProtect()
 
 def init_extensions(app):
     csrf.init_app(app)
+    init_static_assets(app)
+    init_compression(app)
 
     @app.context_processor
     def inject_csrf_token():
-        from flask_wtf.csrf import generate_csrf
-        return dict(csrf_token=generate_csrf)
+        return dict(csrf_token=masked_csrf_token)
 
     @app.before_request
     def enforce_session():
-        allowed_routes = ['auth.login', 'static', 'main.landing'] 
+        # Static files never touch the session (no cookie work, no Vary: Cookie)
+        if is_static_path(request.path):
+            return
+        allowed_routes = ['auth.login', 'main.landing']
         if 'user_id' not in session and request.endpoint not in allowed_routes:
             return redirect(url_for('auth.login'))
 
@@ -3,14 +3,20 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, SelectField
 from wtforms.validators import DataRequired, Optional, Length
 
-class CSRFOnlyForm(FlaskForm):
+from csrf_masking import MaskedFormCSRF
+
+class MaskedForm(FlaskForm):
+    class Meta:
+        csrf_class = MaskedFormCSRF  # fresh token bytes per render (BREACH)
+
+class CSRFOnlyForm(MaskedForm):
     pass
 
-class LoginForm(FlaskForm):
+class LoginForm(MaskedForm):
     identifier = StringField('Username', validators=[DataRequired()])
     passcode = PasswordField('Password', validators=[DataRequired()])
 
-class AssetForm(FlaskForm):
+class AssetForm(MaskedForm):
     category = SelectField('Asset Type', choices=[], validators=[DataRequired()])
     new_type = StringField('Add New Type', validators=[Optional(), Length(max=50)])
 
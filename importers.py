@@ -0,0 +1,462 @@
+#importers.py
+"""
+Streaming Excel import.
+
+The upload is spooled to a temp file and opened with a read-only workbook, so
+rows are pulled from the xlsx lazily. Each sheet's headers are classified once
+(amount / total / GST / date / text) and every row is validated in a single
+pass by iter_preview_rows(), which stores typed values and typed fixes next
+to the display strings.
+
+Parsing and validation live in row_validation.py (no database imports).
+Validation is cheap next to parsing the xlsx, and openpyxl's read-only reader
+parses every row before a requested range, so a job streams its workbook once
+in one process rather than fanning rows out to a pool.
+
+Previews are stored as one small header doc in `import_previews` plus one doc
+per row in `import_preview_rows` (_id = "<preview_id>:<seq>", so an _id range
+is one preview in file order), written in batches as rows are validated.
+"""
+import os
+import re
+import tempfile
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from row_validation import open_workbook, header_plan, validate_rows, sheet_headers_of
+from parsing import format_inr
+from models import assets_collection, asset_types_collection, import_previews_collection, import_preview_rows_collection
+from jobs import job_task
+from type_registry import get_asset_type, get_type_fields, bump_types_version
+from utils import to_bson_date, to_money, is_currency_name, with_derived_fields, stamp_updated, merge_asset, MASTER_SCHEMA
+
+PREVIEW_BATCH_SIZE = 1000
+PREVIEW_PAGE_SIZE = 50
+
+
+def spool_upload(file_storage):
+    """Stream an uploaded file to disk; returns the temp path (caller removes it)."""
+    fd, path = tempfile.mkstemp(prefix="ams_import_", suffix=".xlsx")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            file_storage.save(fh)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def estimate_rows(wb):
+    """Data rows according to each sheet's stored dimensions (None if unknown)."""
+    total = 0
+    for ws in wb.worksheets:
+        if ws.max_row is None:
+            return None
+        total += max(ws.max_row - 1, 0)
+    return total
+
+
+def preview_display(row):
+    """Display strings for a stored row with suggested fixes applied."""
+    data = dict(row["data"])
+    for key, fix in row.get("fixes", {}).items():
+        data[key] = format_inr(fix)
+    return data
+
+
+def row_value(row, key, fixed=False):
+    """Typed value of a stored row's cell (the fix if `fixed`), else its display string."""
+    if fixed and key in row.get("fixes", {}):
+        return row["fixes"][key]
+    values = row.get("values", {})
+    if key in values:
+        return values[key]
+    return row["data"].get(key)
+
+
+def iter_preview_rows(wb, sheet_headers):
+    """
+    Yield preview rows for every sheet of a (read-only) workbook. Headers of
+    sheets that have data are recorded into `sheet_headers` as they are met.
+    """
+    now = datetime.now()
+    for ws in wb.worksheets:
+        rows = ws.iter_rows(values_only=True)
+        first = next(rows, None)
+        if first is None:
+            continue
+
+        headers = sheet_headers_of(first)
+        yield from validate_rows(ws.title, header_plan(headers), _recording(rows, sheet_headers, ws.title, headers), 2, now)
+
+
+def _recording(rows, sheet_headers, title, headers):
+    """Pass rows through, recording the sheet's headers once a row after the header exists."""
+    for row in rows:
+        sheet_headers[title] = headers   # header-only sheets never get here
+        yield row
+
+
+# --- Preview storage ----------------------------------------------------------
+def preview_row_id(preview_id, seq):
+    return f"{preview_id}:{seq:09d}"
+
+
+def preview_rows_query(preview_id, errors_only=False):
+    preview_id = str(preview_id)
+    if errors_only:
+        return {"preview_id": preview_id, "has_errors": True}
+    # ":" < ";" so this range is exactly the ids of this preview
+    return {"_id": {"$gt": f"{preview_id}:", "$lt": f"{preview_id};"}}
+
+
+def save_preview(rows, sheet_headers, batch_size=PREVIEW_BATCH_SIZE, progress=None, stats=None):
+    """
+    Store preview rows as they are produced. Returns the preview header doc
+    (with error_count / row_count and any `stats` counters filled in).
+    `progress(rows_saved)` is called per batch; if anything fails the partial
+    preview is removed.
+    """
+    created_at = datetime.utcnow()
+    preview_id = import_previews_collection.insert_one({
+        "created_at": created_at,
+        "sheet_headers": {},
+        "error_count": 0,
+        "row_count": 0,
+    }).inserted_id
+
+    error_count = row_count = 0
+    batch = []
+    try:
+        for row in rows:
+            row_count += 1
+            has_errors = bool(row["errors"])
+            error_count += has_errors
+            batch.append({
+                "_id": preview_row_id(preview_id, row_count),
+                "preview_id": str(preview_id),
+                "seq": row_count,
+                "has_errors": has_errors,
+                "created_at": created_at,
+                **row,
+            })
+            if len(batch) >= batch_size:
+                import_preview_rows_collection.insert_many(batch, ordered=False)
+                batch = []
+                if progress:
+                    progress(row_count)
+        if batch:
+            import_preview_rows_collection.insert_many(batch, ordered=False)
+    except BaseException:
+        delete_preview(preview_id)
+        raise
+
+    summary = {"sheet_headers": sheet_headers, "error_count": error_count, "row_count": row_count, **(stats or {})}
+    import_previews_collection.update_one({"_id": preview_id}, {"$set": summary})
+    return {"_id": preview_id, "created_at": created_at, **summary}
+
+
+def load_preview(preview_id):
+    """Preview header doc, or None if the id is missing/invalid/expired."""
+    try:
+        return import_previews_collection.find_one({"_id": ObjectId(preview_id)})
+    except (InvalidId, TypeError):
+        return None
+
+
+def iter_saved_rows(preview_id, errors_only=False, batch_size=PREVIEW_BATCH_SIZE):
+    """Stored preview rows in file order."""
+    return (
+        import_preview_rows_collection.find(preview_rows_query(preview_id, errors_only))
+        .sort("_id", 1)
+        .batch_size(batch_size)
+    )
+
+
+def delete_preview(preview_id):
+    import_preview_rows_collection.delete_many(preview_rows_query(preview_id))
+    try:
+        import_previews_collection.delete_one({"_id": ObjectId(preview_id)})
+    except (InvalidId, TypeError):
+        pass
+
+
+# --- Commit (confirm_import) -------------------------------------------------
+COMMIT_BATCH_SIZE = 1000
+MAX_REPORTED_FAILURES = 20
+IMPORT_MODE_INSERT = "insert"
+IMPORT_MODE_MERGE = "merge"
+IMPORT_MODES = (IMPORT_MODE_INSERT, IMPORT_MODE_MERGE)
+DUPLICATE_KEY_ERROR = 11000
+
+
+def preview_modes(preview_doc):
+    """
+    Modes a preview may be committed with, default first. natural_key is
+    unique, so merge is the default; a delta preview (unchanged rows left
+    out) only makes sense as a merge.
+    """
+    if preview_doc.get("skipped_unchanged") is not None:
+        return (IMPORT_MODE_MERGE,)
+    return (IMPORT_MODE_MERGE, IMPORT_MODE_INSERT)
+
+
+def write_error_message(err, mode):
+    """Readable text for one bulk write error; duplicate identifiers name the field."""
+    errmsg = err.get("errmsg", "")
+    natural_key = (err.get("keyValue") or {}).get("natural_key")
+    if natural_key is None:  # servers that only report it in errmsg
+        match = re.search(r'natural_key: "([^"]*)"', errmsg)
+        natural_key = match.group(1) if match else None
+    if err.get("code") != DUPLICATE_KEY_ERROR or not natural_key:
+        return errmsg
+    _category, field, value = (str(natural_key).split("|", 2) + ["", ""])[:3]
+    label = MASTER_SCHEMA.label_of(field) or field
+    if mode == IMPORT_MODE_MERGE:
+        return f"{label} '{value}' was added by someone else during the import; import again to merge it"
+    return f"{label} '{value}' already exists; use Merge to update it"
+
+
+def gst_field_key(key):
+    """GST header/key -> gst_<rate> ("GST (18%)", "gst18" -> gst_18); None for other keys."""
+    key = str(key)
+    if key.lower().startswith("gst"):
+        match = re.search(r"(\d+)", key)
+        if match:
+            return f"gst_{match.group(1)}"
+    return None
+
+
+def header_fields(headers):
+    """Fields of the type created for a sheet that has none."""
+    return [{"label": h, "name": h.lower().replace(" ", "_")} for h in headers if h]
+
+
+def resolve_sheet_type(sheet_name, headers):
+    """Asset type for a sheet; sheets without a type get one built from their headers."""
+    asset_type = get_asset_type(sheet_name)
+    if not asset_type:
+        new_fields = header_fields(headers)
+        asset_types_collection.insert_one({"type_name": sheet_name, "fields": new_fields})
+        bump_types_version()
+        asset_type = {"type_name": sheet_name, "fields": new_fields}
+    return asset_type
+
+
+def compile_import_plan(headers, fields):
+    """
+    Resolve once per sheet: [(header, field_key, convert)]. Headers map to the
+    schema field with the same label, GST headers to gst_<rate>; `convert` is
+    the storage coercion for that key (see utils.coerce_asset_types).
+    """
+    by_label = {}
+    for f in fields:
+        by_label.setdefault(f.get("label"), f.get("name"))
+    date_names = set(MASTER_SCHEMA.date_fields)
+    date_names.update(f.get("name") for f in fields if f.get("type") == "date")
+
+    plan = []
+    for header in headers:
+        if not header:
+            continue
+        field_key = gst_field_key(header)
+        if not field_key:
+            field_key = by_label.get(header) or header
+            field_key = gst_field_key(field_key) or field_key
+        if field_key in date_names:
+            convert = to_bson_date
+        elif is_currency_name(field_key):
+            convert = to_money
+        else:
+            convert = None
+        plan.append((header, field_key, convert))
+    return plan
+
+
+def build_asset(plan, row, sheet_name):
+    asset = {}
+    for header, field_key, convert in plan:
+        value = row_value(row, header)
+        if value is None or (isinstance(value, str) and value.strip() == ""):
+            value = None
+        elif convert:
+            value = convert(value)
+        asset[field_key] = value
+    asset["category"] = sheet_name
+    return with_derived_fields(asset)
+
+
+def stored_by_natural_key(assets):
+    """natural_key -> stored asset, for the imported assets that have one (one query)."""
+    keys = list({a["natural_key"] for a in assets if a.get("natural_key")})
+    if not keys:
+        return {}
+    return {d["natural_key"]: d for d in assets_collection.find({"natural_key": {"$in": keys}})}
+
+
+def asset_writes(items, mode):
+    """
+    Bulk ops for a batch of (imported asset, origin). "insert" always inserts.
+    "merge" lays each row over the stored asset with the same natural_key
+    (utils.merge_asset), so columns the sheet lacks keep their values and
+    content_hash describes the merged doc; rows identical to what is stored
+    get no op at all. Assets without an identifier are always inserted.
+    Returns (ops, origins, unchanged).
+    """
+    if mode != IMPORT_MODE_MERGE:
+        return [InsertOne(stamp_updated(a)) for a, _ in items], [o for _, o in items], 0
+
+    stored = stored_by_natural_key([a for a, _ in items])
+    inserts, merged = [], {}  # natural_key -> (doc, origin); a repeated key merges over the earlier row
+    for asset, origin in items:
+        key = asset.get("natural_key")
+        if not key:
+            inserts.append((InsertOne(stamp_updated(asset)), origin))
+            continue
+        base = merged[key][0] if key in merged else stored.get(key)
+        merged[key] = (merge_asset(base, asset), origin)
+
+    ops, origins, unchanged = [op for op, _ in inserts], [o for _, o in inserts], 0
+    for key, (doc, origin) in merged.items():
+        previous = stored.get(key)
+        if previous is None:
+            ops.append(InsertOne(stamp_updated(doc)))
+        elif doc["content_hash"] == previous.get("content_hash"):
+            unchanged += 1
+            continue
+        else:
+            doc.pop("_id", None)
+            ops.append(UpdateOne({"_id": previous["_id"]}, {"$set": stamp_updated(doc, previous=previous)}))
+        origins.append(origin)
+    return ops, origins, unchanged
+
+
+def commit_preview(preview_id, sheet_headers, mode=IMPORT_MODE_MERGE, batch_size=COMMIT_BATCH_SIZE, progress=None):
+    """
+    Write every row of a stored preview as assets, in unordered batches.
+    `progress(done, total)` is called after each batch. Returns
+    {"inserted", "updated", "unchanged", "failed", "failures": [{"sheet", "row", "error"}, ...]}.
+    """
+    total = import_preview_rows_collection.count_documents(preview_rows_query(preview_id))
+    plans = {}  # sheet -> compiled plan
+    result = {"inserted": 0, "updated": 0, "unchanged": 0, "failed": 0, "failures": []}
+    batch = []
+    done = 0
+
+    def flush():
+        nonlocal done
+        ops, origins, unchanged = asset_writes(batch, mode)
+        result["unchanged"] += unchanged
+        try:
+            counts = assets_collection.bulk_write(ops, ordered=False).bulk_api_result if ops else {}
+        except BulkWriteError as e:
+            counts = e.details
+            for err in counts.get("writeErrors", []):
+                result["failed"] += 1
+                if len(result["failures"]) < MAX_REPORTED_FAILURES:
+                    sheet, row_no = origins[err["index"]]
+                    result["failures"].append({"sheet": sheet, "row": row_no, "error": write_error_message(err, mode)})
+        result["inserted"] += counts.get("nInserted", 0) + counts.get("nUpserted", 0)
+        result["updated"] += counts.get("nModified", 0)
+        result["unchanged"] += counts.get("nMatched", 0) - counts.get("nModified", 0)
+        done += len(batch)
+        print(f"📥 Import batch: {done}/{total} rows ({result['inserted']} inserted, "
+              f"{result['updated']} updated, {result['unchanged']} unchanged, {result['failed']} failed)")
+        if progress:
+            progress(done, total)
+
+    for row in iter_saved_rows(preview_id, batch_size=batch_size):
+        sheet_name = row.get("sheet")
+        plan = plans.get(sheet_name)
+        if plan is None:
+            headers = sheet_headers.get(sheet_name, list(row["data"].keys()))
+            plan = plans[sheet_name] = compile_import_plan(headers, resolve_sheet_type(sheet_name, headers)["fields"])
+
+        batch.append((build_asset(plan, row, sheet_name), (sheet_name, row.get("row"))))
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+    return result
+
+
+# --- Delta imports -------------------------------------------------------------
+def skip_unchanged(rows, sheet_headers, stats, batch_size=PREVIEW_BATCH_SIZE):
+    """
+    Drop rows a merge import would not change: merged over the stored asset
+    with the same natural_key (as asset_writes does), the content_hash is
+    the stored one. Rows without an identifier are dropped when an identical
+    asset exists. stats["skipped_unchanged"] counts them. Nothing is created
+    here: sheets without a type are hashed with the fields confirm_import
+    would create for them.
+    """
+    plans = {}
+    stats.setdefault("skipped_unchanged", 0)
+
+    def flush(batch):
+        stored = stored_by_natural_key([a for _, a in batch])
+        hashes = [a["content_hash"] for _, a in batch if not a.get("natural_key")]
+        identical = {d["content_hash"] for d in assets_collection.find({"content_hash": {"$in": hashes}}, {"content_hash": 1})} if hashes else set()
+        for row, asset in batch:
+            previous = stored.get(asset.get("natural_key"))
+            if previous is not None:
+                unchanged = merge_asset(previous, asset)["content_hash"] == previous.get("content_hash")
+            else:
+                unchanged = not asset.get("natural_key") and asset["content_hash"] in identical
+            if unchanged:
+                stats["skipped_unchanged"] += 1
+            else:
+                yield row
+
+    batch = []
+    for row in rows:
+        sheet_name = row["sheet"]
+        plan = plans.get(sheet_name)
+        if plan is None:
+            headers = sheet_headers.get(sheet_name, list(row["data"].keys()))
+            fields = get_type_fields(sheet_name) or header_fields(headers)
+            plan = plans[sheet_name] = compile_import_plan(headers, fields)
+        batch.append((row, build_asset(plan, row, sheet_name)))
+        if len(batch) >= batch_size:
+            yield from flush(batch)
+            batch = []
+    if batch:
+        yield from flush(batch)
+
+
+# --- Background job task (see jobs.py) ----------------------------------------
+@job_task("import_excel")
+def import_excel_job(job, path, delta=False):
+    """
+    Validate a spooled upload into a stored preview; removes the upload when
+    done. With `delta`, rows identical to an existing asset are left out.
+    """
+    sheet_headers = {}
+    stats = {}
+    try:
+        wb = open_workbook(path)
+        try:
+            total = estimate_rows(wb)
+            job.progress(0, total, "Validating rows")
+            rows = iter_preview_rows(wb, sheet_headers)
+            if delta:
+                rows = skip_unchanged(rows, sheet_headers, stats)
+            preview = save_preview(rows, sheet_headers, progress=lambda n: job.progress(n, total), stats=stats)
+        finally:
+            wb.close()
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+    job.progress(preview["row_count"], preview["row_count"])
+    return {
+        "preview_id": str(preview["_id"]),
+        "next": "export.open_import_job",
+        "message": f"✅ {preview['row_count']} rows to review, {preview['error_count']} with errors"
+                   + (f", {preview['skipped_unchanged']} unchanged skipped." if delta else "."),
+    }
@@ -3,6 +3,7 @@
 from pymongo import MongoClient
 from getpass import getpass
 from werkzeug.security import generate_password_hash
+from models import normalize_username
 
 # MongoDB setup
 client = MongoClient("mongodb://localhost:27017/")
@@ -325,10 +326,10 @@ print("\n✅ Asset types initialized successfully.")
 # Admin setup (safe interactive)
 if users_collection.count_documents({}) == 0:
     print("\n--- Admin Setup ---")
-    username = input("Enter admin username: ").strip().lower()
+    username = normalize_username(input("Enter admin username: "))
     password = getpass("Enter admin password: ")
     hashed_password = generate_password_hash(password)
-    users_collection.insert_one({"username": username, "password": hashed_password})
+    users_collection.insert_one({"username": username, "username_lc": username, "password": hashed_password})
     print("\n✅ Admin user created successfully.")
 else:
     print("\nℹ️ Admin user(s) already exists. Skipping user creation.")
@@ -0,0 +1,239 @@
+#jobs.py
+"""
+Background jobs for imports, exports and backups.
+
+Routes call submit_job(kind, params) and return straight away; the work runs
+on a local thread pool and its state lives in the `jobs` collection so any
+web worker can answer status / cancel / download requests. Task functions are
+registered with @job_task("kind") next to the code they wrap and receive a
+Job handle for progress reporting, cancellation checks and result files.
+
+Each process heartbeats the jobs it owns from the scheduler ticker (see
+heartbeat_jobs), so a job only goes stale when its process is gone, and
+reap_stale_jobs runs on every leader tick rather than once per start.
+
+Result files are written to JOB_RESULTS_DIR on the worker's disk. With more
+than one app instance it must point at shared storage (e.g. an NFS mount);
+otherwise only a single instance is supported, since a download may land on
+a process that cannot see the file.
+"""
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+
+from config import Config
+from models import jobs_collection
+
+JOB_RESULTS_DIR = os.path.abspath(Config.JOB_RESULTS_DIR)
+JOB_WORKERS = Config.JOB_WORKERS
+# Finished jobs (and their result files) are kept this long
+JOB_RESULT_TTL = timedelta(hours=24)
+# A running job that has not reported progress for this long is considered dead
+STALE_AFTER = timedelta(minutes=15)
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+_tasks = {}  # kind -> function(job, **params)
+_executor = None
+_executor_lock = threading.Lock()
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobCancelled(Exception):
+    """Raised inside a task when its job has been cancelled."""
+
+
+def job_task(kind):
+    """Register a task function: fn(job, **params) -> result dict."""
+    def register(fn):
+        _tasks[kind] = fn
+        return fn
+    return register
+
+
+def registered_kinds():
+    return sorted(_tasks)
+
+
+class Job:
+    """Handle passed to a running task."""
+
+    def __init__(self, doc):
+        self.id = doc["_id"]
+        self.kind = doc["kind"]
+        self.params = doc.get("params", {})
+
+    def progress(self, done, total=None, message=None):
+        """Record progress; raises JobCancelled once a cancel was requested."""
+        update = {"progress.done": done, "heartbeat_at": datetime.utcnow()}
+        if total is not None:
+            update["progress.total"] = total
+        if message is not None:
+            update["progress.message"] = message
+        doc = jobs_collection.find_one_and_update(
+            {"_id": self.id}, {"$set": update}, projection={"cancel_requested": 1}
+        )
+        if doc and doc.get("cancel_requested"):
+            raise JobCancelled()
+
+    def check_cancelled(self):
+        doc = jobs_collection.find_one({"_id": self.id}, {"cancel_requested": 1})
+        if doc and doc.get("cancel_requested"):
+            raise JobCancelled()
+
+    def result_path(self, suffix=""):
+        os.makedirs(JOB_RESULTS_DIR, exist_ok=True)
+        return os.path.join(JOB_RESULTS_DIR, f"{self.id}{suffix}")
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="ams-job")
+            reap_stale_jobs()
+        return _executor
+
+
+def submit_job(kind, params=None, owner=None):
+    """Queue a registered task; returns the job id (str)."""
+    if kind not in _tasks:
+        raise ValueError(f"Unknown job kind: {kind}")
+    now = datetime.utcnow()
+    job_id = jobs_collection.insert_one({
+        "kind": kind,
+        "params": params or {},
+        "owner": owner,
+        "status": "queued",
+        "progress": {"done": 0, "total": None, "message": None},
+        "cancel_requested": False,
+        "created_at": now,
+        "heartbeat_at": now,
+        "worker": WORKER_ID,  # queued on this process's executor
+    }).inserted_id
+    _get_executor().submit(_run_job, job_id)
+    purge_expired_results()
+    return str(job_id)
+
+
+def _finish(job_id, status, **fields):
+    now = datetime.utcnow()
+    jobs_collection.update_one({"_id": job_id}, {"$set": {
+        "status": status,
+        "finished_at": now,
+        "expires_at": now + JOB_RESULT_TTL,
+        **fields,
+    }})
+
+
+def _run_job(job_id):
+    doc = jobs_collection.find_one_and_update(
+        {"_id": job_id, "status": "queued", "cancel_requested": False},
+        {"$set": {"status": "running", "started_at": datetime.utcnow(), "worker": WORKER_ID,
+                  "heartbeat_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not doc:
+        return  # cancelled while queued
+
+    started = time.monotonic()
+    job = Job(doc)
+    try:
+        result = _tasks[job.kind](job, **job.params) or {}
+        _finish(job_id, "done", result=result, seconds=round(time.monotonic() - started, 2))
+        print(f"✅ Job {job_id} ({job.kind}) done in {time.monotonic() - started:.1f}s")
+    except JobCancelled:
+        _finish(job_id, "cancelled", seconds=round(time.monotonic() - started, 2))
+        print(f"⚠️ Job {job_id} ({job.kind}) cancelled")
+    except Exception as e:
+        _finish(job_id, "failed", error=str(e), seconds=round(time.monotonic() - started, 2))
+        print(f"❌ Job {job_id} ({job.kind}) failed: {e}")
+        traceback.print_exc()
+
+
+def get_job(job_id, owner=None):
+    try:
+        query = {"_id": ObjectId(job_id)}
+    except (InvalidId, TypeError):
+        return None
+    if owner is not None:
+        query["owner"] = owner
+    return jobs_collection.find_one(query)
+
+
+def list_jobs(owner, limit=10):
+    return list(jobs_collection.find({"owner": owner}).sort("created_at", -1).limit(limit))
+
+
+def cancel_job(job_id, owner=None):
+    """Request cancellation; queued jobs are cancelled at once. Returns the updated doc."""
+    job = get_job(job_id, owner)
+    if not job or job["status"] in FINISHED_STATUSES:
+        return job
+    jobs_collection.update_one({"_id": job["_id"]}, {"$set": {"cancel_requested": True}})
+    jobs_collection.update_one(
+        {"_id": job["_id"], "status": "queued"},
+        {"$set": {"status": "cancelled", "finished_at": datetime.utcnow(),
+                  "expires_at": datetime.utcnow() + JOB_RESULT_TTL}},
+    )
+    return get_job(job_id)
+
+
+def heartbeat_jobs():
+    """Mark this process's queued / running jobs as alive (called every scheduler tick)."""
+    jobs_collection.update_many(
+        {"worker": WORKER_ID, "status": {"$in": list(ACTIVE_STATUSES)}},
+        {"$set": {"heartbeat_at": datetime.utcnow()}},
+    )
+
+
+def reap_stale_jobs():
+    """Fail jobs whose worker stopped reporting (e.g. the process was restarted)."""
+    cutoff = datetime.utcnow() - STALE_AFTER
+    result = jobs_collection.update_many(
+        {"status": {"$in": list(ACTIVE_STATUSES)}, "heartbeat_at": {"$lt": cutoff}},
+        {"$set": {"status": "failed", "error": "Interrupted (worker stopped)",
+                  "finished_at": datetime.utcnow(), "expires_at": datetime.utcnow() + JOB_RESULT_TTL}},
+    )
+    if result.modified_count:
+        print(f"⚠️ Marked {result.modified_count} stale jobs as failed")
+
+
+def purge_expired_results():
+    """Remove result files older than JOB_RESULT_TTL (their job docs expire via TTL)."""
+    if not os.path.isdir(JOB_RESULTS_DIR):
+        return
+    cutoff = time.time() - JOB_RESULT_TTL.total_seconds()
+    for name in os.listdir(JOB_RESULTS_DIR):
+        path = os.path.join(JOB_RESULTS_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def job_status(job):
+    """JSON-safe view of a job doc for the status endpoints."""
+    result = job.get("result") or {}
+    return {
+        "id": str(job["_id"]),
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": job.get("progress", {}),
+        "error": job.get("error"),
+        "message": result.get("message"),
+        "has_file": bool(result.get("file")),
+        "created_at": job["created_at"].isoformat() if job.get("created_at") else None,
+        "finished_at": job["finished_at"].isoformat() if job.get("finished_at") else None,
+        "seconds": job.get("seconds"),
+    }
@@ -1,22 +1,21 @@
 #migration.py
+"""
+Run pending schema migrations (see migrations/).
 
-from models import assets_collection
-from routes.main import safe_to_float, normalize_gst_keys
+    python migration.py                 # apply everything pending
+    python migration.py --dry-run       # report what would change, write nothing
+    python migration.py --only 1 --batch-size 2000
+"""
+import argparse
 
-for asset in assets_collection.find({}):
-    updated = False
-    asset = normalize_gst_keys(asset)
-    sanitized_asset = {}
+from migrations import run_migrations, DEFAULT_BATCH_SIZE
 
-    for key, value in asset.items():
-        # MongoDB does not allow . in key names
-        new_key = key.replace(".", "_").strip()
-        # Convert numeric fields
-        if new_key in ["amount", "total"] or new_key.startswith("gst_"):
-            value = safe_to_float(value, 0.0)
-        sanitized_asset[new_key] = value
-        if sanitized_asset.get(new_key) != asset.get(key):
-            updated = True
 
-    if updated:
-        assets_collection.update_one({"_id": asset["_id"]}, {"$set": sanitized_asset})
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run AMS schema migrations.")
+    parser.add_argument("--dry-run", action="store_true", help="Read and transform only; write nothing.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--only", type=int, help="Run a single migration ID.")
+    args = parser.parse_args()
+
+    run_migrations(batch_size=args.batch_size, dry_run=args.dry_run, only=args.only)
@@ -0,0 +1,146 @@
+#migrations/__init__.py
+"""
+Numbered, idempotent schema migrations.
+
+Each module `mNNNN_<name>.py` in this package defines:
+    ID          - int, unique and increasing
+    DESCRIPTION - one line for the log
+    COLLECTION  - collection name the migration walks (document migrations)
+    FILTER      - optional query limiting the documents visited
+    transform(doc) -> new document, or None when the doc is already up to date
+or, for migrations that are not per-document (indexes etc.):
+    apply(db, dry_run) -> int (number of changes)
+
+Progress lives in the `schema_migrations` collection:
+    {_id: ID, name, status: running|done, last_id, processed, changed, started_at, finished_at, seconds}
+Document migrations read in _id order, write back with unordered bulk_write
+and checkpoint last_id after each batch, so a crashed run resumes where it stopped.
+"""
+import importlib
+import pkgutil
+import time
+from datetime import datetime
+
+from pymongo import ReplaceOne
+
+from models import db
+from backups import INCREMENTAL_COLLECTIONS
+from utils import DERIVED_FIELDS
+
+schema_migrations_collection = db["schema_migrations"]
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def discover():
+    """All migration modules, sorted by ID."""
+    modules = []
+    for info in pkgutil.iter_modules(__path__):
+        if info.name.startswith("m") and info.name[1:5].isdigit():
+            modules.append(importlib.import_module(f"{__name__}.{info.name}"))
+    modules.sort(key=lambda m: m.ID)
+    ids = [m.ID for m in modules]
+    if len(ids) != len(set(ids)):
+        raise RuntimeError(f"Duplicate migration IDs: {ids}")
+    return modules
+
+
+def pending(modules=None):
+    done = {d["_id"] for d in schema_migrations_collection.find({"status": "done"}, {"_id": 1})}
+    return [m for m in (modules or discover()) if m.ID not in done]
+
+
+def _content(doc):
+    return {k: v for k, v in doc.items() if k not in DERIVED_FIELDS}
+
+
+def _run_documents(migration, state, batch_size, dry_run):
+    collection = db[migration.COLLECTION]
+    base_filter = getattr(migration, "FILTER", None) or {}
+    last_id = state.get("last_id")
+    processed = state.get("processed", 0)
+    changed = state.get("changed", 0)
+    started = time.monotonic()
+    # Docs whose content changes must show up in the next incremental backup
+    updated_field = INCREMENTAL_COLLECTIONS.get(migration.COLLECTION)
+
+    while True:
+        query = dict(base_filter)
+        if last_id is not None:
+            query = {"$and": [base_filter, {"_id": {"$gt": last_id}}]} if base_filter else {"_id": {"$gt": last_id}}
+        batch = list(collection.find(query).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        ops = []
+        for doc in batch:
+            new_doc = migration.transform(doc)
+            if new_doc is not None:
+                if updated_field and _content(new_doc) != _content(doc):
+                    new_doc[updated_field] = datetime.utcnow()
+                ops.append(ReplaceOne({"_id": doc["_id"]}, new_doc))
+
+        if ops and not dry_run:
+            collection.bulk_write(ops, ordered=False)
+
+        last_id = batch[-1]["_id"]
+        processed += len(batch)
+        changed += len(ops)
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else 0
+        print(f"   … {migration.ID:04d}: {processed} read, {changed} changed ({rate:,.0f} docs/s)")
+
+        if not dry_run:
+            schema_migrations_collection.update_one(
+                {"_id": migration.ID},
+                {"$set": {"last_id": last_id, "processed": processed, "changed": changed}},
+            )
+
+    return processed, changed
+
+
+def run_migration(migration, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    name = migration.__name__.rsplit(".", 1)[-1]
+    state = schema_migrations_collection.find_one({"_id": migration.ID}) or {}
+    if state.get("status") == "done":
+        return
+
+    if dry_run:
+        # Dry runs always start from the beginning and never record progress
+        state = {}
+    else:
+        schema_migrations_collection.update_one(
+            {"_id": migration.ID},
+            {"$set": {"name": name, "status": "running"},
+             "$setOnInsert": {"started_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    resumed = " (resuming)" if state.get("last_id") is not None else ""
+    print(f"▶️ {migration.ID:04d} {migration.DESCRIPTION}{resumed}{' [dry run]' if dry_run else ''}")
+    started = time.monotonic()
+
+    if hasattr(migration, "apply"):
+        processed = changed = migration.apply(db, dry_run)
+    else:
+        processed, changed = _run_documents(migration, state, batch_size, dry_run)
+
+    seconds = time.monotonic() - started
+    print(f"✅ {migration.ID:04d} done: {processed} read, {changed} changed in {seconds:.1f}s")
+
+    if not dry_run:
+        schema_migrations_collection.update_one(
+            {"_id": migration.ID},
+            {"$set": {"status": "done", "finished_at": datetime.utcnow(), "seconds": round(seconds, 2)}},
+        )
+
+
+def run_migrations(batch_size=DEFAULT_BATCH_SIZE, dry_run=False, only=None):
+    todo = pending()
+    if only is not None:
+        todo = [m for m in todo if m.ID == only]
+    if not todo:
+        print("ℹ️ No pending migrations.")
+        return
+    for migration in todo:
+        run_migration(migration, batch_size=batch_size, dry_run=dry_run)
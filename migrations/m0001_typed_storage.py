@@ -0,0 +1,29 @@
+#migrations/m0001_typed_storage.py
+from utils import normalize_gst_keys, coerce_asset_types, with_derived_fields, DERIVED_FIELDS
+from type_registry import get_type_fields
+
+ID = 1
+DESCRIPTION = "Clean asset keys, store BSON dates / Decimal128 money, rebuild search + sort fields"
+COLLECTION = "assets"
+
+
+def transform(asset):
+    upgraded = {}
+    for key, value in normalize_gst_keys(asset).items():
+        if key in DERIVED_FIELDS:
+            continue
+        # MongoDB does not allow . in key names
+        new_key = key.replace(".", "_").strip() if key != "_id" else key
+        upgraded[new_key] = value
+
+    coerce_asset_types(upgraded, get_type_fields(upgraded.get("category")))
+    with_derived_fields(upgraded)
+    # natural_key is unique; m0002 assigns it and settles duplicates
+    upgraded.pop("natural_key", None)
+    if "natural_key" in asset:
+        upgraded["natural_key"] = asset["natural_key"]
+    # updated_at is not part of the typed payload; the runner bumps it when content changes
+    upgraded.pop("updated_at", None)
+    if "updated_at" in asset:
+        upgraded["updated_at"] = asset["updated_at"]
+    return upgraded if upgraded != asset else None
@@ -0,0 +1,44 @@
+#migrations/m0002_natural_keys.py
+from pymongo import UpdateOne
+
+from natural_keys import build_natural_key
+
+ID = 2
+DESCRIPTION = "Backfill asset natural_key (oldest asset wins when identifiers collide)"
+
+BATCH_SIZE = 1000
+MAX_REPORTED = 20
+
+
+def apply(db, dry_run):
+    assets = db["assets"]
+    seen = set(assets.distinct("natural_key", {"natural_key": {"$type": "string"}}))
+    ops, changed, duplicates = [], 0, []
+
+    for asset in assets.find({"natural_key": {"$not": {"$type": "string"}}}).sort("_id", 1).batch_size(BATCH_SIZE):
+        key = build_natural_key(asset)
+        if key in seen:
+            duplicates.append((asset["_id"], key))
+            key = None
+        if key is None:
+            if "natural_key" not in asset:
+                ops.append(UpdateOne({"_id": asset["_id"]}, {"$set": {"natural_key": None}}))
+        else:
+            seen.add(key)
+            ops.append(UpdateOne({"_id": asset["_id"]}, {"$set": {"natural_key": key}}))
+
+        if len(ops) >= BATCH_SIZE:
+            if not dry_run:
+                assets.bulk_write(ops, ordered=False)
+            changed += len(ops)
+            ops = []
+    if ops:
+        if not dry_run:
+            assets.bulk_write(ops, ordered=False)
+        changed += len(ops)
+
+    if duplicates:
+        print(f"⚠️ {len(duplicates)} assets share an identifier with an older asset and were left unkeyed:")
+        for _id, key in duplicates[:MAX_REPORTED]:
+            print(f"   {_id}  {key}")
+    return changed
@@ -0,0 +1,14 @@
+#migrations/m0003_content_hash.py
+from utils import DERIVED_FIELDS
+from natural_keys import build_content_hash
+
+ID = 3
+DESCRIPTION = "Backfill asset content_hash for delta imports"
+COLLECTION = "assets"
+
+
+def transform(asset):
+    content_hash = build_content_hash({k: v for k, v in asset.items() if k not in DERIVED_FIELDS})
+    if asset.get("content_hash") == content_hash:
+        return None
+    return {**asset, "content_hash": content_hash}
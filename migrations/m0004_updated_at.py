@@ -0,0 +1,12 @@
+#migrations/m0004_updated_at.py
+from datetime import datetime
+
+ID = 4
+DESCRIPTION = "Backfill asset updated_at for incremental backups"
+
+
+def apply(db, dry_run):
+    query = {"updated_at": {"$exists": False}}
+    if dry_run:
+        return db["assets"].count_documents(query)
+    return db["assets"].update_many(query, {"$set": {"updated_at": datetime.utcnow()}}).modified_count
@@ -0,0 +1,31 @@
+#migrations/m0005_username_lc.py
+from pymongo import UpdateOne
+
+from models import normalize_username
+
+ID = 5
+DESCRIPTION = "Backfill users.username_lc for indexed exact-match login (oldest user wins on case clashes)"
+
+
+def apply(db, dry_run):
+    users = db["users"]
+    seen = set(users.distinct("username_lc", {"username_lc": {"$type": "string"}}))
+    ops, duplicates = [], []
+
+    for user in users.find({"username_lc": {"$not": {"$type": "string"}}}, {"username": 1}).sort("_id", 1):
+        name = normalize_username(user.get("username"))
+        if not name:
+            continue
+        if name in seen:
+            duplicates.append((user["_id"], user.get("username")))
+            continue
+        seen.add(name)
+        ops.append(UpdateOne({"_id": user["_id"]}, {"$set": {"username_lc": name}}))
+
+    if ops and not dry_run:
+        users.bulk_write(ops, ordered=False)
+    if duplicates:
+        print(f"⚠️ {len(duplicates)} users differ from an older user only by case and were left without username_lc:")
+        for _id, username in duplicates:
+            print(f"   {_id}  {username}")
+    return len(ops)
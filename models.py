@@ -1,7 +1,7 @@
 #models.py
 from pymongo import MongoClient
-from bson.objectid import ObjectId
-from datetime import datetime
+from pymongo.collation import Collation
+from sort_keys import sort_index_specs
 
 client = MongoClient('mongodb://localhost:27017/')
 db = client['ams']
@@ -10,6 +10,38 @@ users_collection = db['users']
 assets_collection = db['assets']
 asset_types_collection = db['asset_types']
 import_previews_collection = db['import_previews']
+import_preview_rows_collection = db['import_preview_rows']
+app_meta_collection = db['app_meta']
+jobs_collection = db['jobs']
+schedules_collection = db['schedules']
+schedule_runs_collection = db['schedule_runs']
+scheduler_lease_collection = db['scheduler_lease']
+
+# --- Search index: multikey over write-time trigrams (see search_index.py) ---
+assets_collection.create_index("search_grams")
+
+# --- Hot filters on typed fields (BSON dates, see utils.coerce_asset_types) ---
+assets_collection.create_index([("category", 1), ("status", 1)])
+assets_collection.create_index("given_date")
+assets_collection.create_index("purchase_date")
+
+# --- Natural identifiers for merge imports (see natural_keys.py) ---
+# Partial: assets without an identifier store None and are not indexed
+assets_collection.create_index(
+    "natural_key",
+    unique=True,
+    partialFilterExpression={"natural_key": {"$type": "string"}},
+    name="natural_key_unique"
+)
+
+# --- Delta imports: rows whose content hash already exists are skipped ---
+assets_collection.create_index("content_hash")
+# --- Incremental backups: assets changed since the last snapshot ---
+assets_collection.create_index("updated_at")
+
+# --- Dashboard sorting: (sort_keys.<column>, _id) for keyset pages ---
+for spec in sort_index_specs():
+    assets_collection.create_index(spec)
 
 # --- TTL Index for auto-expiring import previews ---
 # Will auto-delete after 2 hours (7200 seconds)
@@ -17,3 +49,39 @@ import_previews_collection.create_index(
     "created_at",
     expireAfterSeconds=7200
 )
+
+# --- Import preview rows: one doc per row, _id = "<preview_id>:<seq>" ---
+# Rows expire with their preview; the partial index serves the "errors only" view
+import_preview_rows_collection.create_index(
+    "created_at",
+    expireAfterSeconds=7200
+)
+import_preview_rows_collection.create_index(
+    [("preview_id", 1), ("_id", 1)],
+    partialFilterExpression={"has_errors": True},
+    name="preview_errors_only"
+)
+
+# --- Background jobs: per-user listing + expiry once finished (expires_at) ---
+jobs_collection.create_index([("owner", 1), ("created_at", -1)])
+jobs_collection.create_index("expires_at", expireAfterSeconds=0)
+
+# --- Scheduler: due schedules + run history per schedule, pruned after 90 days ---
+schedules_collection.create_index([("enabled", 1), ("next_run_at", 1)])
+schedule_runs_collection.create_index([("schedule", 1), ("due_at", -1)])
+schedule_runs_collection.create_index("status")
+schedule_runs_collection.create_index("due_at", expireAfterSeconds=90 * 24 * 3600)
+
+# --- Users: exact-match login on the normalized name; collation index for case-insensitive lookups ---
+USERNAME_COLLATION = Collation(locale="en", strength=2)
+users_collection.create_index(
+    "username_lc",
+    unique=True,
+    partialFilterExpression={"username_lc": {"$type": "string"}},
+    name="username_lc_unique"
+)
+users_collection.create_index("username", collation=USERNAME_COLLATION, name="username_ci")
+
+
+def normalize_username(username):
+    return str(username or "").strip().lower()
@@ -0,0 +1,79 @@
+#natural_keys.py
+"""
+Asset identity: natural identifiers and content hashes.
+
+Natural identifiers are the ones export_keka already uses as Asset ID.
+
+Each asset stores `natural_key` = "<type>|<field>|<value>" derived at write
+time from its type's identifying field, e.g. "mobile|imei1|356938035643809".
+A unique partial index on it (strings only) lets merge imports match rows to
+existing assets with UpdateOne(upsert=True); assets without an identifier
+store None and are never matched.
+
+`content_hash` is a SHA-256 of the asset's non-blank, non-derived fields in a
+canonical form. Imports hash each row the same way and skip rows whose hash
+already exists, so re-sending an unchanged workbook writes nothing.
+"""
+import hashlib
+import json
+from datetime import datetime, date
+
+from bson.decimal128 import Decimal128
+
+# casefolded type name -> identifying field; other types use DEFAULT_NATURAL_KEY
+NATURAL_KEY_FIELDS = {
+    "mobile": "imei1",
+    "franchise inv": "user_code",
+    "desktop": "cpu_asset_tag",
+    "printer": "asset_tag",
+    "all-in-one": "asset_tag",
+}
+DEFAULT_NATURAL_KEY = "serial_no"
+
+
+def _type_key(category):
+    return str(category or "").strip().casefold()
+
+
+def natural_key_field(category):
+    return NATURAL_KEY_FIELDS.get(_type_key(category), DEFAULT_NATURAL_KEY)
+
+
+def build_natural_key(asset):
+    """Natural key string for an asset, or None if it has no identifier."""
+    category = _type_key(asset.get("category"))
+    if not category:
+        return None
+    field = natural_key_field(category)
+    value = asset.get(field)
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # numeric cells (IMEIs, codes) read from Excel
+    value = str(value).strip().casefold()
+    if not value or value in ("none", "null", "-", "na", "n/a"):
+        return None
+    return f"{category}|{field}|{value}"
+
+
+def _canonical(value):
+    if isinstance(value, datetime):
+        # BSON dates keep milliseconds only
+        return value.replace(microsecond=value.microsecond // 1000 * 1000).isoformat()
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day).isoformat()
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, (str, int, float, bool, list, dict)):
+        return value
+    return str(value)
+
+
+def build_content_hash(asset):
+    """Stable hash of an asset's content (pass it without _id / derived fields)."""
+    items = sorted(
+        (str(k), _canonical(v)) for k, v in asset.items()
+        if k != "_id" and v is not None and not (isinstance(v, str) and v.strip() == "")
+    )
+    payload = json.dumps(items, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
@@ -0,0 +1,66 @@
+#parsing.py
+"""
+Pure value parsing / formatting helpers (no Flask, no database), shared by the
+web app and the import worker processes (see row_validation.py).
+"""
+from datetime import datetime, date
+
+DATE_INPUT_FORMATS = ("%d-%m-%Y", "%Y-%m-%d", "%d/%m/%Y", "%Y-%m-%d %H:%M:%S")
+
+
+def safe_to_float(v, default=0.0):
+    """Robustly convert values like '₹1,23,456.78', '1,23,456.78', 'None', None -> float."""
+    if v is None:
+        return default
+    s = str(v).strip()
+    if s.lower() == "none" or s == "":
+        return default
+    s = s.replace("₹", "").replace(",", "")
+    try:
+        return float(s)
+    except Exception:
+        return default
+
+
+def to_bson_date(val):
+    """
+    Coerce a form/import value to a datetime (stored as a BSON date).
+    Blank -> None; unparseable strings are returned unchanged so no data is lost.
+    """
+    if isinstance(val, datetime):
+        return val
+    if isinstance(val, date):
+        return datetime(val.year, val.month, val.day)
+    if val is None or str(val).strip() == "":
+        return None
+    s = str(val).strip()
+    for fmt in DATE_INPUT_FORMATS:
+        try:
+            return datetime.strptime(s, fmt)
+        except ValueError:
+            pass
+    return val
+
+
+def format_inr(value):
+    """Format number into Indian currency style with rupee symbol."""
+    if value is None or value == "":
+        return "—"
+    try:
+        # Ensure float
+        value = float(str(value).replace(",", ""))
+        # Split integer and decimal
+        integer, dot, fraction = f"{value:.2f}".partition(".")
+        # Indian number system formatting
+        last3 = integer[-3:]
+        rest = integer[:-3]
+        if rest:
+            rest = ",".join(
+                [rest[max(i - 2, 0):i] for i in range(len(rest), 0, -2)][::-1]
+            )
+            formatted = rest + "," + last3
+        else:
+            formatted = last3
+        return f"₹{formatted}.{fraction}"
+    except Exception:
+        return str(value)
@@ -0,0 +1,117 @@
+#response_compression.py
+"""
+Content-negotiated gzip / brotli for dynamic responses.
+
+An after_request hook compresses HTML, JSON, CSV, NDJSON and other text
+responses when the browser sends a matching Accept-Encoding (brotli preferred
+when the optional `brotli` package is installed):
+
+- buffered responses only when at least COMPRESS_MIN_SIZE bytes;
+- streamed responses (CSV / NDJSON exports, file downloads) are wrapped in an
+  incremental compressor that flushes per chunk, so rows still arrive as they
+  are produced and the body is never buffered;
+- already-compressed content is left alone: anything with a Content-Encoding
+  (precompressed static files, ?gzip=1 exports) and any type outside
+  COMPRESSIBLE_MIMETYPES (xlsx and parquet are zip / internally compressed);
+- HTML with a CSRF token is safe to compress because the token is masked
+  afresh on every render (see csrf_masking.py, BREACH).
+"""
+import zlib
+
+from flask import request
+
+from config import Config
+from static_assets import is_static_path
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only without it
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    "text/html", "text/plain", "text/css", "text/csv", "text/javascript",
+    "application/json", "application/javascript", "application/x-ndjson", "image/svg+xml",
+}
+GZIP_LEVEL = Config.COMPRESS_LEVEL
+BROTLI_QUALITY = Config.COMPRESS_BROTLI_QUALITY
+MIN_SIZE = Config.COMPRESS_MIN_SIZE
+
+
+def choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_bytes(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of chunks, flushing after each so the client sees progress."""
+    try:
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            for chunk in chunks:
+                out = compressor.process(_as_bytes(chunk)) + compressor.flush()
+                if out:
+                    yield out
+            yield compressor.finish()
+        else:
+            compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            for chunk in chunks:
+                out = compressor.compress(_as_bytes(chunk)) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                if out:
+                    yield out
+            yield compressor.flush()
+    finally:
+        # Pass close() through so file iterators clean up on client disconnect
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def _as_bytes(chunk):
+    return chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+
+
+def should_compress(response):
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES or "Content-Encoding" in response.headers:
+        return False
+    if "no-transform" in (response.headers.get("Cache-Control") or ""):
+        return False
+    return not (request.method == "HEAD" or request.range or is_static_path(request.path))
+
+
+def compress_response(response):
+    if not should_compress(response):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding()
+    if not encoding:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < MIN_SIZE:
+            return response
+        response.set_data(compress_bytes(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    if response.get_etag()[0]:
+        # Same resource, different bytes: the strong validator no longer holds
+        response.set_etag(response.get_etag()[0], weak=True)
+    return response
+
+
+def init_compression(app):
+    app.after_request(compress_response)
@@ -3,21 +3,28 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, make_response
 from werkzeug.security import check_password_hash, generate_password_hash
 from forms import LoginForm
-from extensions import csrf
-from models import users_collection
+from models import users_collection, normalize_username, USERNAME_COLLATION
 
 
 auth_bp = Blueprint('auth', __name__)
 
+def find_user(username):
+    """Exact match on username_lc; users not yet backfilled fall back to the collation index."""
+    name = normalize_username(username)
+    if not name:
+        return None
+    return users_collection.find_one({'username_lc': name}) or users_collection.find_one(
+        {'username': name, 'username_lc': {'$exists': False}}, collation=USERNAME_COLLATION)
+
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     form = LoginForm()
 
     if request.method == 'POST' and form.validate_on_submit():
-        identifier = request.form['identifier'].strip().lower()
+        identifier = normalize_username(request.form['identifier'])
         password = request.form['passcode']
 
-        user = users_collection.find_one({'username': {'$regex': f'^{identifier}$', '$options': 'i'}})
+        user = find_user(identifier)
 
         if user and check_password_hash(user['password'], password):
             session.permanent = True  # 🔐 Enables expiry
@@ -45,8 +52,6 @@ def logout():
     response.set_cookie('theme', '', expires=0)  # Example: clearing a custom cookie
     return response
 
-from flask import jsonify
-
 @auth_bp.route('/api/change_password', methods=['POST'])
 
 def api_change_password():
@@ -64,8 +69,7 @@ def api_change_password():
     if not current_pw or not new_pw or not confirm_pw:
         return jsonify(error="All fields are required."), 400
 
-    username = session['username']
-    user = users_collection.find_one({'username': {'$regex': f'^{username}$', '$options': 'i'}})
+    user = find_user(session['username'])
 
     if not user or not check_password_hash(user["password"], current_pw):
         return jsonify(error="Current password is incorrect."), 400
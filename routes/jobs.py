@@ -0,0 +1,88 @@
+#routes/jobs.py
+from flask import Blueprint, jsonify, request, session, url_for, flash, redirect
+import os
+
+from jobs import submit_job, get_job, list_jobs, cancel_job, job_status
+from exporters import file_stream_response
+
+jobs_bp = Blueprint('jobs', __name__)
+
+# Kinds that can be queued directly via POST /jobs/submit/<kind> (no upload needed)
+SUBMITTABLE_KINDS = {"export_excel", "export_keka", "backup"}
+
+
+def current_owner():
+    return session.get('user_id')
+
+
+def wants_json():
+    return request.is_json or request.headers.get("X-Requested-With") == "XMLHttpRequest" \
+        or request.accept_mimetypes.best == "application/json"
+
+
+def job_payload(job):
+    data = job_status(job)
+    job_id = data["id"]
+    result = job.get("result") or {}
+    data["status_url"] = url_for("jobs.job_detail", job_id=job_id)
+    data["cancel_url"] = url_for("jobs.job_cancel", job_id=job_id)
+    data["download_url"] = url_for("jobs.job_download", job_id=job_id) if result.get("file") else None
+    data["next_url"] = url_for(result["next"], job_id=job_id) if result.get("next") else None
+    return data
+
+
+def enqueue_response(kind, params=None, message="⏳ Job started."):
+    """Queue a job from a regular route: JSON for XHR callers, else back to the dashboard which polls it."""
+    job_id = submit_job(kind, params, owner=current_owner())
+    if wants_json():
+        return jsonify(job_payload(get_job(job_id))), 202
+    flash(message, "info")
+    return redirect(url_for('main.dashboard', job=job_id))
+
+
+# === ⏳ JOB ENDPOINTS =========================================
+@jobs_bp.route('/', methods=['GET'])
+def job_list():
+    return jsonify([job_payload(j) for j in list_jobs(current_owner())])
+
+
+@jobs_bp.route('/submit/<kind>', methods=['POST'])
+def job_submit(kind):
+    if kind not in SUBMITTABLE_KINDS:
+        return jsonify({"error": f"Unknown job kind: {kind}"}), 400
+    params = {}
+    ids = (request.get_json(silent=True) or {}).get("ids") if request.is_json else request.form.get("ids")
+    if ids and kind != "backup":
+        params["ids"] = ",".join(ids) if isinstance(ids, list) else ids
+    backup_kind = request.values.get("type")
+    if kind == "backup" and backup_kind in ("auto", "full", "incremental"):
+        params["kind"] = backup_kind
+    job_id = submit_job(kind, params, owner=current_owner())
+    return jsonify(job_payload(get_job(job_id))), 202
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def job_detail(job_id):
+    job = get_job(job_id, owner=current_owner())
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_payload(job))
+
+
+@jobs_bp.route('/<job_id>/cancel', methods=['POST'])
+def job_cancel(job_id):
+    job = cancel_job(job_id, owner=current_owner())
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_payload(job))
+
+
+@jobs_bp.route('/<job_id>/download', methods=['GET'])
+def job_download(job_id):
+    job = get_job(job_id, owner=current_owner())
+    result = (job or {}).get("result") or {}
+    path = result.get("file")
+    if not job or job["status"] != "done" or not path or not os.path.exists(path):
+        flash("⚠️ Download not available (job unfinished or expired).", "warning")
+        return redirect(url_for('main.dashboard'))
+    return file_stream_response(path, result["filename"], result["mimetype"], delete=False)
@@ -1,34 +1,53 @@
 #routes/main.py
-from flask import Blueprint, request, render_template, session, redirect, url_for, flash, jsonify, send_from_directory
+from flask import Blueprint, request, render_template, session, redirect, url_for, flash, jsonify
 from bson.objectid import ObjectId
 from datetime import datetime, date
 from models import assets_collection, asset_types_collection
+from type_registry import get_asset_type, has_type, resolve_type_name, list_type_names, bump_types_version
+from search_index import search_filter, SEARCH_FIELDS
+from sort_keys import parse_sort_param
+from natural_keys import natural_key_field
+from pymongo.errors import DuplicateKeyError
 from forms import AssetForm
 from extensions import csrf, format_inr
-import re
-from utils import normalize_asset_data, get_master_fields, get_indian_states, get_all_existing_types, normalize_imported_asset
+from static_assets import send_static
+from utils import normalize_asset_data, get_master_fields, get_indian_states, get_all_existing_types, keyset_page, MASTER_SCHEMA, INTERNAL_FIELDS, DERIVED_FIELDS, derived_fields, with_derived_fields, stamp_updated
+from utils import normalize_gst_keys, coerce_asset_types, format_date
+from parsing import safe_to_float
 
 
 main_bp = Blueprint('main', __name__)
 
-def parse_ddmmyyyy_to_date(val):
-    try:
-        return datetime.strptime(val.strip(), "%d-%m-%Y") if val else None
-    except Exception:
-        return None
-    
-def safe_to_float(v, default=0.0):
-    """Robustly convert values like '₹1,23,456.78', '1,23,456.78', 'None', None -> float."""
-    if v is None:
-        return default
-    s = str(v).strip()
-    if s.lower() == "none" or s == "":
-        return default
-    s = s.replace("₹", "").replace(",", "")
+# --- Dashboard paging ---
+PAGE_SIZES = [25, 50, 100, 200, 500, 1000, 2000]
+DEFAULT_PAGE_SIZE = 25
+# Exact counts above this are reported as "N+" instead of scanning further
+COUNT_LIMIT = 10000
+DASHBOARD_COLUMNS = ["category", "model", "system_model", "username", "given_date",
+                     "purchase_date", "area", "status", "remarks"]
+
+def duplicate_identifier_message(asset):
+    field = natural_key_field(asset.get("category"))
+    label = MASTER_SCHEMA.label_of(field) or field
+    return f"Another {asset.get('category')} already has {label} '{asset.get(field)}'."
+
+def get_page_size(value):
     try:
-        return float(s)
-    except Exception:
-        return default
+        size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return size if size in PAGE_SIZES else DEFAULT_PAGE_SIZE
+
+def count_assets(query=None):
+    """
+    Cheap asset count for the pager.
+    Unfiltered -> collection metadata estimate; filtered -> exact count capped at COUNT_LIMIT.
+    Returns (count, is_capped).
+    """
+    if not query:
+        return assets_collection.estimated_document_count(), False
+    count = assets_collection.count_documents(query, limit=COUNT_LIMIT + 1)
+    return min(count, COUNT_LIMIT), count > COUNT_LIMIT
 
 def format_inr_no_symbol(value):
     """Indian-format number string without the rupee symbol (for edit inputs)."""
@@ -48,7 +67,7 @@ def format_inr_no_symbol(value):
     
 @main_bp.route('/assets/<path:filename>')
 def serve_assets(filename):
-    return send_from_directory('public/assets', filename)
+    return send_static('public/assets', filename)
 
 @main_bp.route('/')
 def landing():
@@ -59,28 +78,60 @@ def dashboard():
     if 'user_id' not in session:
         return redirect(url_for('auth.login'))
 
-    raw_assets = list(assets_collection.find())
-    asset_types = list(asset_types_collection.find())
-
+    per_page = get_page_size(request.args.get("per_page"))
+    after = request.args.get("after")
+    before = request.args.get("before")
+    try:
+        start = max(int(request.args.get("start", 0)), 0)
+    except ValueError:
+        start = 0
+
+    # Only the columns the table shows (plus label-style keys from older imports)
+    display_fields = [MASTER_SCHEMA.by_name[c] for c in DASHBOARD_COLUMNS if c in MASTER_SCHEMA.by_name]
+    projection = {col: 1 for col in DASHBOARD_COLUMNS}
+    projection.update({f["label"]: 1 for f in display_fields})
+
+    page = keyset_page(
+        assets_collection,
+        sort_field="_id",
+        limit=per_page,
+        after=after,
+        before=before,
+        projection=projection,
+    )
     assets = []
-    for asset in raw_assets:
+    for asset in page["items"]:
         asset_copy = asset.copy()
-        category = asset.get("category", "")
-        type_match = next((t for t in asset_types if t.get("type_name", "").lower() == category.lower()), None)
-        asset_copy["type_name"] = type_match["type_name"] if type_match else category
+        category = asset.get("category", "") or ""
+        asset_copy["type_name"] = resolve_type_name(category)
         asset_copy["_id"] = str(asset_copy["_id"])
 
         # Optionally normalize imported fields
         # For example, if imported asset has "Given Date", map it to "given_date"
-        for field in get_master_fields():
+        for field in display_fields:
             key = field["name"]
             label = field["label"]
             if key not in asset_copy and label in asset_copy:
                 asset_copy[key] = asset_copy[label]
+            if isinstance(asset_copy.get(key), (datetime, date)):
+                asset_copy[key] = format_date(asset_copy[key])
 
         assets.append(asset_copy)
 
-    return render_template('dashboard.html', assets=assets)
+    total, total_capped = count_assets()
+    # `start` is only a display offset for the Sr. No. column; the cursor does the paging
+    if before and not page["prev_cursor"]:
+        start = 0
+    pagination = {
+        "per_page": per_page,
+        "start": start,
+        "total": total,
+        "total_capped": total_capped,
+        "next_url": url_for("main.dashboard", after=page["next_cursor"], per_page=per_page, start=start + per_page) if page["next_cursor"] else None,
+        "prev_url": url_for("main.dashboard", before=page["prev_cursor"], per_page=per_page, start=max(start - per_page, 0)) if page["prev_cursor"] else None,
+    }
+
+    return render_template('dashboard.html', assets=assets, pagination=pagination, page_sizes=PAGE_SIZES)
 
 @main_bp.route("/create_type", methods=["POST"])
 def create_type():
@@ -110,7 +161,7 @@ def create_type():
                 print("❌ Field missing required keys:", field)
                 return jsonify(success=False, message="Each field must have 'name', 'label', and 'type'."), 400
 
-        if asset_types_collection.find_one({"type_name": type_name}):
+        if has_type(type_name):
             print("⚠️ Type already exists:", type_name)
             return jsonify(success=False, message="Type already exists."), 409
 
@@ -118,6 +169,7 @@ def create_type():
             "type_name": type_name,
             "fields": fields
         })
+        bump_types_version()
 
         print("✅ Type saved successfully:", type_name)
         return jsonify(success=True, message="Type created successfully.")
@@ -128,12 +180,11 @@ def create_type():
 
 @main_bp.route('/get_asset_types')
 def get_asset_types():
-    types = asset_types_collection.find({}, {"_id": 0, "type_name": 1})
-    return jsonify([doc["type_name"] for doc in types])
+    return jsonify(list_type_names())
 
 @main_bp.route('/get_fields/<asset_type>')
 def get_fields(asset_type):
-    config = asset_types_collection.find_one({'type_name': asset_type})
+    config = get_asset_type(asset_type)
     if config and 'fields' in config:
         fields = config["fields"]
 
@@ -163,14 +214,9 @@ def get_master_fields_api():
 def filter_assets():
     search = request.form.get("search", "").strip().lower()
     sort = request.form.get("sort", "").strip()
-
-    def normalize(val):
-        """Convert values to lowercase strings for searching."""
-        if val is None:
-            return ""
-        if isinstance(val, (datetime, date)):
-            return val.strftime("%d-%m-%Y").lower()
-        return str(val).replace(",", "").replace("₹", "").replace("INR", "").replace("USD", "").strip().lower()
+    per_page = get_page_size(request.form.get("per_page"))
+    after = request.form.get("after")
+    before = request.form.get("before")
 
     def format_display(val):
         """Convert values for display in JSON output."""
@@ -180,102 +226,43 @@ def filter_assets():
             return val.strftime("%d-%m-%Y")
         return str(val)
 
-    field_configs = get_master_fields()
-    assets = list(assets_collection.find())
-    asset_types = list(asset_types_collection.find())
-
-    # ---------- SEARCH ----------
-    if search:
-        matched_assets = []
-        for asset in assets:
-            matched = False
-            category = asset.get("category", "")
-            type_match = next((t for t in asset_types if t.get("type_name", "").lower() == category.lower()), None)
-
-            # Match against master fields
-            for field in field_configs:
-                key = field.get("name")
-                if normalize(search) in normalize(asset.get(key)):
-                    matched = True
-                    break
-
-            # Match against all fields except _id
-            if not matched:
-                for key, value in asset.items():
-                    if key == "_id":
-                        continue
-                    if normalize(search) in normalize(value):
-                        matched = True
-                        break
-
-            # Match against category
-            if not matched and normalize(search) in normalize(category):
-                matched = True
-
-            # Match against type_name
-            if not matched and type_match and normalize(search) in normalize(type_match.get("type_name", "")):
-                matched = True
-
-            # Match against labels in type fields
-            if not matched and type_match:
-                for field in type_match.get("fields", []):
-                    if normalize(search) in normalize(field.get("label", "")):
-                        matched = True
-                        break
-
-            if matched:
-                matched_assets.append(asset)
-    else:
-        matched_assets = assets
+    # ---------- SEARCH (via search_grams index) + SORT (typed sort_keys) ----------
+    query = search_filter(search) if search else {}
+    sort_field, direction = parse_sort_param(sort)
+    page = keyset_page(
+        assets_collection,
+        query=query,
+        sort_field=sort_field,
+        direction=direction,
+        limit=per_page,
+        after=after,
+        before=before,
+        projection={f: 0 for f in SEARCH_FIELDS},
+    )
+    total, total_capped = count_assets(query)
 
     # ---------- FORMAT FOR CLIENT ----------
     results = []
-    for asset in matched_assets:
+    for asset in page["items"]:
         result = {"_id": str(asset["_id"])}
         for key, value in asset.items():
+            if key in INTERNAL_FIELDS:
+                continue
             result[key] = format_display(value)
 
         category = asset.get("category", "")
-        type_match = next((t for t in asset_types if t.get("type_name", "").lower() == category.lower()), None)
-        if type_match:
-            result["type_name"] = type_match.get("type_name", category)
+        if has_type(category):
+            result["type_name"] = resolve_type_name(category)
 
         results.append(result)
 
-    # ---------- SORT ----------
-    if sort:
-        key, direction = sort.rsplit("_", 1)
-        reverse = direction == "desc"
-
-        def parse_date(val):
-            if not val or val == "—":
-                return datetime.min
-            for fmt in ("%d-%m-%Y", "%Y-%m-%d", "%Y-%m-%d %H:%M:%S"):
-                try:
-                    return datetime.strptime(str(val), fmt)
-                except Exception:
-                    pass
-            return datetime.min
-
-        def parse_currency(val):
-            if not val or val == "—":
-                return 0
-            try:
-                return float(str(val).replace(",", "").replace("₹", "").replace("INR", "").replace("USD", "").strip())
-            except Exception:
-                return 0
-
-        def sort_key(asset):
-            val = asset.get(key, "")
-            if "date" in key:
-                return parse_date(val)
-            if any(x in key for x in ("price", "cost", "amount", "value", "total", "gst")):
-                return parse_currency(val)
-            return str(val).lower()
-
-        results.sort(key=sort_key, reverse=reverse)
-
-    return jsonify(results)
+    return jsonify({
+        "assets": results,
+        "next_cursor": page["next_cursor"],
+        "prev_cursor": page["prev_cursor"],
+        "total": total,
+        "total_capped": total_capped,
+    })
 
 @main_bp.route("/create_asset", methods=["GET", "POST"])
 def create_asset():
@@ -308,52 +295,40 @@ def create_asset():
                 {"$set": {"fields": full_predefined}},
                 upsert=True
             )
+            bump_types_version()
 
         # ✅ Fetch config AFTER type is saved
         if is_new_type:
             fields_to_render = full_predefined
         else:
-            selected_config = asset_types_collection.find_one({"type_name": selected_type})
+            selected_config = get_asset_type(selected_type)
             fields_to_render = selected_config["fields"] if selected_config else []
 
         allowed_fields = [f["name"] for f in fields_to_render]
 
-        for field in ["given_date", "purchase_date", "collected_date", "prev_given_date"]:
-            date_str = raw_data.get(field, "")
-            parsed_date = parse_ddmmyyyy_to_date(date_str.strip()) if date_str.strip() else None
-            if parsed_date:
-                raw_data[field] = parsed_date.strftime("%d-%m-%Y")
-            else:
-                raw_data[field] = date_str
-
-        for money_field in ["amount", "total"]:
-            if raw_data.get(money_field):
-                raw_data[money_field] = raw_data[money_field].replace("₹", "").replace(",", "")
-
         normalized = normalize_asset_data(raw_data)
         raw_data.update(normalized)
 
-        payload = {}
-        for field_name in allowed_fields:
-            value = raw_data.get(field_name, "")
-            if isinstance(value, datetime):
-                value = value.strftime("%d-%m-%Y")
-            payload[field_name] = value
-
         # Ensure all allowed fields are present, even if empty
+        payload = {}
         for field_name in allowed_fields:
-            payload.setdefault(field_name, "")
+            payload[field_name] = raw_data.get(field_name, "")
 
         payload["category"] = selected_type
+        # Dates -> BSON dates, amount/total/gst_* -> Decimal128
+        coerce_asset_types(payload, fields_to_render)
 
-        assets_collection.insert_one(payload)
+        try:
+            assets_collection.insert_one(stamp_updated(with_derived_fields(payload)))
+        except DuplicateKeyError:
+            flash(duplicate_identifier_message(payload), "danger")
+            return redirect(url_for("main.create_asset"))
 
         flash("Asset added successfully.", "success")
         return redirect(url_for("main.dashboard"))
 
     # GET route: Populate dropdown and form
-    types = asset_types_collection.find({}, {"type_name": 1})
-    form.category.choices = [(t["type_name"], t["type_name"]) for t in types]
+    form.category.choices = [(t, t) for t in list_type_names()]
     form.category.choices.append(("add_new_type", "add_new_type"))
 
     selected_type = request.args.get("type")
@@ -366,7 +341,7 @@ def create_asset():
                 if not field.get("options"):
                     field["options"] = get_indian_states()
     elif selected_type:
-        config = asset_types_collection.find_one({"type_name": selected_type})
+        config = get_asset_type(selected_type)
         if config and "fields" in config:
             fields_to_render = config["fields"]
 
@@ -380,25 +355,6 @@ def create_asset():
     )
 
 
-def normalize_gst_keys(asset: dict) -> dict:
-    """
-    Ensure GST keys follow format: gst_22 (instead of gst_(22%) or gst22)
-    """
-    normalized = {}
-    for key, value in asset.items():
-        key_str = str(key)
-        if key_str.lower().startswith("gst"):
-            # Extract digits from key
-            match = re.search(r"(\d+)", key_str)
-            if match:
-                new_key = f"gst_{match.group(1)}"
-                normalized[new_key] = value
-            else:
-                normalized[key] = value
-        else:
-            normalized[key] = value
-    return normalized
-
 @main_bp.route("/edit_asset/<asset_id>", methods=["GET", "POST"])
 def edit_asset(asset_id):
     asset = assets_collection.find_one({"_id": ObjectId(asset_id)})
@@ -410,7 +366,7 @@ def edit_asset(asset_id):
     asset = normalize_gst_keys(asset)
 
     selected_type = asset.get("category", "")
-    config = asset_types_collection.find_one({"type_name": selected_type})
+    config = get_asset_type(selected_type)
     fields_to_render = config.get("fields", []) if config else []
     allowed_fields = [f["name"] for f in fields_to_render]
 
@@ -451,6 +407,10 @@ def edit_asset(asset_id):
             val_num = amount_numeric + total_gst
             val = format_inr_no_symbol(val_num)
 
+        elif isinstance(raw_val, (datetime, date)):
+            # Stored as a BSON date; the picker expects dd-mm-YYYY
+            val = format_date(raw_val)
+
         else:
             val = "" if raw_val in [None, ""] else raw_val
 
@@ -463,21 +423,6 @@ def edit_asset(asset_id):
         raw_data.pop("csrf_token", None)
         raw_data.pop("submit", None)
 
-        # Parse dates
-        for field in ["given_date", "purchase_date", "collected_date", "prev_given_date"]:
-            date_str = raw_data.get(field, "")
-            parsed_date = parse_ddmmyyyy_to_date(date_str.strip()) if date_str.strip() else None
-            raw_data[field] = parsed_date.strftime("%d-%m-%Y") if parsed_date else date_str
-
-        # Normalize numeric fields -> raw decimals for DB
-        for money_field in ["amount", "total"]:
-            if money_field in raw_data:
-                raw_data[money_field] = safe_to_float(raw_data[money_field], 0.0)
-
-        for key in list(raw_data.keys()):
-            if key.startswith("gst_"):
-                raw_data[key] = safe_to_float(raw_data.get(key), 0.0)
-
         # Normalize name/category/status/owner (your existing helper)
         raw_data.update(normalize_asset_data(raw_data))
 
@@ -488,8 +433,20 @@ def edit_asset(asset_id):
             payload[key] = val
 
         payload["category"] = selected_type
+        # Dates -> BSON dates, amount/total/gst_* -> Decimal128
+        coerce_asset_types(payload, fields_to_render)
+
+        # Derived fields come from the whole document, not just the edited keys
+        merged = {k: v for k, v in asset.items() if k not in DERIVED_FIELDS}
+        merged.update(payload)
+        payload.update(derived_fields(merged))
+        stamp_updated(payload, previous=asset)
 
-        assets_collection.update_one({"_id": ObjectId(asset_id)}, {"$set": payload})
+        try:
+            assets_collection.update_one({"_id": ObjectId(asset_id)}, {"$set": payload})
+        except DuplicateKeyError:
+            flash(duplicate_identifier_message(merged), "danger")
+            return redirect(url_for("main.edit_asset", asset_id=asset_id))
 
         flash("Asset updated successfully.", "success")
         return redirect(url_for("main.dashboard"))
@@ -529,7 +486,7 @@ def view_asset(asset_id):
 
     view_data = []
     for key, value in asset.items():
-        if key == "_id":
+        if key in INTERNAL_FIELDS:
             continue
 
         # Determine if this field should be formatted as currency
@@ -0,0 +1,155 @@
+#row_validation.py
+"""
+Row parsing and validation for Excel imports.
+
+Kept free of Flask and database imports, so it can be used (and tested)
+without a Mongo connection.
+"""
+import re
+from collections import OrderedDict
+from datetime import datetime
+
+from openpyxl import load_workbook
+
+from parsing import safe_to_float, to_bson_date, format_inr
+
+GST_HEADER_RE = re.compile(r"\((\d+)\s*%?\)")
+PREVIEW_DATE_FORMAT = "%d-%m-%Y"
+
+
+def open_workbook(path):
+    return load_workbook(path, read_only=True, data_only=True)
+
+
+def is_blank_row(row):
+    return all(v is None or str(v).strip() == "" for v in row)
+
+
+def header_plan(headers):
+    """Classify each header once per sheet: [(header, kind, gst_rate)]."""
+    plan = []
+    for header in headers:
+        h_low = header.lower()
+        if h_low == "amount":
+            plan.append((header, "amount", None))
+        elif h_low == "total":
+            plan.append((header, "total", None))
+        elif h_low.startswith("gst") and "(" in header and ")" in header:
+            match = GST_HEADER_RE.search(header)
+            plan.append((header, "gst", float(match.group(1)) if match else None))
+        elif "date" in h_low:
+            plan.append((header, "date", None))
+        else:
+            plan.append((header, "text", None))
+    return plan
+
+
+def validate_row(plan, row, now):
+    """
+    One pass over a row -> (data, values, errors, suggestions, fixes).
+
+    data        header -> display string
+    values      header -> typed value (float / datetime) for money and date columns
+    suggestions header -> display string of the suggested fix
+    fixes       header -> typed corrected value
+    Later steps (preview, fixed download, confirm) only look these up.
+    """
+    row_data = OrderedDict()
+    values = {}
+    errors = {}
+    suggestions = {}
+    fixes = {}
+
+    amount_val = total_val = None
+    gst_rate = gst_amount = None
+    gst_header_name = None   # the exact GST header we used
+    total_header = None
+    gst_seen_once = False    # exactly one GST column per row
+
+    for col_index, (header, kind, rate) in enumerate(plan):
+        value = row[col_index] if col_index < len(row) else ""
+
+        if kind == "amount":
+            amount_val = safe_to_float(value, 0.0)
+            values[header] = amount_val
+            row_data[header] = format_inr(amount_val)
+
+        elif kind == "total":
+            total_val = safe_to_float(value, 0.0)
+            values[header] = total_val
+            total_header = total_header or header
+            row_data[header] = format_inr(total_val)
+
+        elif kind == "gst":
+            this_gst_amount = safe_to_float(value, 0.0)
+            values[header] = this_gst_amount
+            if rate is None:
+                errors[header] = "Invalid GST header/value"
+                suggestions[header] = "₹0.00"
+                fixes[header] = 0.0
+                row_data[header] = str(value) if value is not None else ""
+                continue
+            if gst_seen_once:
+                errors[header] = "Multiple GST columns not allowed"
+            else:
+                gst_seen_once = True
+                gst_rate, gst_amount, gst_header_name = rate, this_gst_amount, header
+            row_data[header] = format_inr(this_gst_amount)
+
+        elif kind == "date" and value:
+            # DD-MM-YYYY; future dates are not allowed and never auto-fixed
+            row_data[header] = str(value).strip()
+            try:
+                dt_obj = value if isinstance(value, datetime) else datetime.strptime(str(value).strip(), PREVIEW_DATE_FORMAT)
+                if dt_obj > now:
+                    errors[header] = "Future date not allowed"
+                values[header] = dt_obj
+                row_data[header] = dt_obj.strftime(PREVIEW_DATE_FORMAT)
+            except Exception:
+                errors[header] = "Invalid date format"
+                # Other accepted input formats still import as dates
+                parsed = to_bson_date(value)
+                if isinstance(parsed, datetime):
+                    values[header] = parsed
+
+        else:
+            row_data[header] = "" if value is None else str(value).strip()
+
+    # --- GST / Total validation ---
+    if amount_val is not None and gst_rate is not None and gst_amount is not None:
+        expected_gst = round(amount_val * gst_rate / 100, 2)
+
+        if round(gst_amount, 2) != expected_gst and gst_header_name:
+            errors[gst_header_name] = f"GST mismatch ({int(gst_rate)}%)"
+            suggestions[gst_header_name] = f"Expected: {format_inr(expected_gst)}"
+            fixes[gst_header_name] = expected_gst
+
+        if total_val is not None:
+            expected_total = round(amount_val + expected_gst, 2)
+            if total_header and round(total_val, 2) != expected_total:
+                errors[total_header] = "Total mismatch"
+                suggestions[total_header] = f"Expected: {format_inr(expected_total)}"
+                fixes[total_header] = expected_total
+
+    return row_data, values, errors, suggestions, fixes
+
+
+def sheet_headers_of(first_row):
+    return [str(h).strip() if h else "" for h in first_row]
+
+
+def validate_rows(sheet, plan, rows, start, now):
+    """Preview rows for consecutive sheet rows numbered from `start` (blank rows skipped)."""
+    for idx, row in enumerate(rows, start=start):
+        if is_blank_row(row):
+            continue
+        row_data, values, errors, suggestions, fixes = validate_row(plan, row, now)
+        yield {
+            "sheet": sheet,
+            "row": idx,
+            "data": row_data,
+            "values": values,
+            "errors": errors,
+            "suggestions": suggestions,
+            "fixes": fixes,
+        }
@@ -0,0 +1,182 @@
+#scheduler.py
+"""
+Persistent, single-leader scheduler for recurring jobs.
+
+Schedules are declared in code with schedule_task(name, kind, every) next to
+the job they run, and stored in the `schedules` collection:
+    {_id: name, kind, params, interval, jitter, enabled, next_run_at, last_run_at}
+so the next due time survives restarts. Every process runs a small ticker
+thread, but only the holder of the `scheduler_lease` document acts on due
+schedules; the lease expires if its holder dies and another process takes
+over. A schedule that was missed (e.g. the app was down) runs once on the
+next tick and is then re-planned from "now", with random jitter.
+
+Due schedules are handed to jobs.submit_job(), so they show up like any other
+job; `schedule_runs` keeps the history (due_at, job id, status, seconds). The
+ticker also heartbeats this process's jobs, and the leader reaps dead ones.
+"""
+import atexit
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from models import schedules_collection, schedule_runs_collection, scheduler_lease_collection
+from jobs import submit_job, get_job, heartbeat_jobs, reap_stale_jobs, WORKER_ID, FINISHED_STATUSES
+
+TICK_SECONDS = 30
+LEASE_TTL = timedelta(seconds=TICK_SECONDS * 3)
+LEASE_ID = "scheduler"
+
+_schedules = {}  # name -> definition
+_started = False
+_start_lock = threading.Lock()
+
+
+def schedule_task(name, kind, every, jitter=timedelta(minutes=5), params=None):
+    """Declare a recurring job: run job `kind` with `params` every `every` (timedelta)."""
+    _schedules[name] = {
+        "kind": kind,
+        "params": params or {},
+        "interval": int(every.total_seconds()),
+        "jitter": int(jitter.total_seconds()),
+    }
+
+
+def _jitter(schedule):
+    return timedelta(seconds=random.uniform(0, schedule.get("jitter") or 0))
+
+
+def sync_schedules():
+    """Write the declared schedules to Mongo, keeping each one's next_run_at; disable the rest."""
+    now = datetime.utcnow()
+    for name, definition in _schedules.items():
+        schedules_collection.update_one(
+            {"_id": name},
+            {"$set": definition,
+             "$setOnInsert": {"enabled": True, "next_run_at": now + timedelta(seconds=definition["interval"]),
+                              "last_run_at": None, "created_at": now}},
+            upsert=True,
+        )
+    # Declared again after being removed: re-enable (manual disables are kept)
+    schedules_collection.update_many(
+        {"_id": {"$in": list(_schedules)}, "disabled_by": "sync"},
+        {"$set": {"enabled": True, "next_run_at": now}, "$unset": {"disabled_by": "", "disabled_at": ""}},
+    )
+    # Renamed or removed from code: stop firing
+    result = schedules_collection.update_many(
+        {"_id": {"$nin": list(_schedules)}, "enabled": True},
+        {"$set": {"enabled": False, "disabled_by": "sync", "disabled_at": now}},
+    )
+    if result.modified_count:
+        print(f"⚠️ Disabled {result.modified_count} schedules no longer declared in code")
+
+
+# --- Leadership ------------------------------------------------------------------
+def acquire_lease():
+    """Take or renew the scheduler lease. True if this process is the leader."""
+    now = datetime.utcnow()
+    try:
+        doc = scheduler_lease_collection.find_one_and_update(
+            {"_id": LEASE_ID, "$or": [{"holder": WORKER_ID}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"holder": WORKER_ID, "expires_at": now + LEASE_TTL, "renewed_at": now}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        return False  # someone else holds a live lease
+    return bool(doc and doc["holder"] == WORKER_ID)
+
+
+def release_lease():
+    scheduler_lease_collection.delete_one({"_id": LEASE_ID, "holder": WORKER_ID})
+
+
+# --- Running ---------------------------------------------------------------------
+def next_run_after(schedule, due_at, now):
+    """First slot after `now` on the schedule's grid, plus jitter. Missed slots are skipped."""
+    interval = timedelta(seconds=schedule["interval"])
+    missed = max(0, int((now - due_at) / interval))
+    return due_at + interval * (missed + 1) + _jitter(schedule), missed
+
+
+def run_due_schedules(now=None):
+    """Submit every due schedule once. Only call while holding the lease."""
+    now = now or datetime.utcnow()
+    started = 0
+    for schedule in schedules_collection.find({"enabled": True, "next_run_at": {"$lte": now}}):
+        due_at = schedule["next_run_at"]
+        next_run_at, missed = next_run_after(schedule, due_at, now)
+        # Claim by moving next_run_at; a stale leader that lost the race gets None
+        claimed = schedules_collection.find_one_and_update(
+            {"_id": schedule["_id"], "next_run_at": due_at},
+            {"$set": {"next_run_at": next_run_at, "last_run_at": now}},
+        )
+        if not claimed:
+            continue
+
+        run = {"schedule": schedule["_id"], "kind": schedule["kind"], "due_at": due_at,
+               "started_at": now, "missed": missed, "worker": WORKER_ID}
+        try:
+            run["job_id"] = submit_job(schedule["kind"], schedule.get("params"), owner=None)
+            run["status"] = "running"
+        except Exception as e:
+            run.update(status="failed", error=str(e), finished_at=now)
+            print(f"❌ Schedule {schedule['_id']} could not start: {e}")
+        schedule_runs_collection.insert_one(run)
+        started += 1
+        caught_up = f" (caught up, {missed} missed)" if missed else ""
+        print(f"⏰ Schedule {schedule['_id']} → job {run.get('job_id')}{caught_up}; next at {next_run_at:%Y-%m-%d %H:%M}")
+    return started
+
+
+def record_finished_runs():
+    """Copy status and duration from finished jobs into their schedule_runs entries."""
+    for run in schedule_runs_collection.find({"status": "running"}):
+        job = get_job(run.get("job_id"))
+        if job and job["status"] not in FINISHED_STATUSES:
+            continue
+        update = {"status": job["status"] if job else "unknown", "finished_at": (job or {}).get("finished_at")}
+        if job:
+            update["seconds"] = job.get("seconds")
+            update["error"] = job.get("error")
+        schedule_runs_collection.update_one({"_id": run["_id"]}, {"$set": update})
+
+
+def schedule_history(name, limit=20):
+    return list(schedule_runs_collection.find({"schedule": name}).sort("due_at", -1).limit(limit))
+
+
+def _tick():
+    heartbeat_jobs()  # every process, leader or not
+    if not acquire_lease():
+        return
+    reap_stale_jobs()
+    run_due_schedules()
+    record_finished_runs()
+
+
+def _loop():
+    # Spread the first tick so workers booted together don't all race for the lease
+    time.sleep(random.uniform(0, TICK_SECONDS / 3))
+    while True:
+        try:
+            _tick()
+        except Exception as e:
+            print(f"❌ Scheduler tick failed: {e}")
+        time.sleep(TICK_SECONDS)
+
+
+def start_scheduler():
+    """Sync schedules and start this process's ticker thread (once per process)."""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    sync_schedules()
+    atexit.register(release_lease)
+    threading.Thread(target=_loop, name="ams-scheduler", daemon=True).start()
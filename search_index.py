@@ -0,0 +1,100 @@
+#search_index.py
+"""
+Write-time search index for assets.
+
+Every asset carries two derived fields:
+  search_text  - normalized values joined by newlines (exact substring check)
+  search_grams - distinct trigrams of those values (multikey index)
+
+A search term is resolved through the `search_grams` index ($all of its
+trigrams) and then confirmed with a regex on `search_text`, so results keep
+the old "substring of any field" behaviour without a collection scan.
+"""
+import re
+from datetime import datetime, date
+
+from type_registry import resolve_type_name, list_type_names, get_type_labels
+
+GRAM_SIZE = 3
+SEARCH_FIELDS = ("search_text", "search_grams")
+# Keys that never take part in search
+SKIP_KEYS = {"_id", *SEARCH_FIELDS}
+
+
+def normalize_search_value(val):
+    """Lowercase string form of a value, as used for searching."""
+    if val is None:
+        return ""
+    if isinstance(val, (datetime, date)):
+        return val.strftime("%d-%m-%Y").lower()
+    return str(val).replace(",", "").replace("₹", "").replace("INR", "").replace("USD", "").strip().lower()
+
+
+def grams(text, n=GRAM_SIZE):
+    if len(text) < n:
+        return set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def build_search_fields(asset):
+    """Derived search fields for a full asset document."""
+    values = []
+    for key, value in asset.items():
+        if key in SKIP_KEYS or isinstance(value, (dict, list)):
+            continue
+        norm = normalize_search_value(value)
+        if norm:
+            values.append(norm)
+
+    category = asset.get("category") or ""
+    type_name = normalize_search_value(resolve_type_name(category))
+    if type_name and type_name not in values:
+        values.append(type_name)
+
+    all_grams = set()
+    for v in values:
+        all_grams |= grams(v)
+
+    return {
+        "search_text": "\n".join(values),
+        "search_grams": sorted(all_grams),
+    }
+
+
+def with_search_fields(asset):
+    """Return `asset` with search_text / search_grams filled in."""
+    asset.update(build_search_fields(asset))
+    return asset
+
+
+def _types_matching(term):
+    """Type names whose name or field labels contain the term (matches every asset of that type)."""
+    matches = []
+    for type_name in list_type_names():
+        if term in normalize_search_value(type_name) or any(
+            term in normalize_search_value(label) for label in get_type_labels(type_name)
+        ):
+            matches.append(type_name)
+    return matches
+
+
+def search_filter(term):
+    """Mongo filter for assets matching `term` (substring, case-insensitive)."""
+    term = normalize_search_value(term)
+    if not term:
+        return {}
+
+    text_match = {"search_text": {"$regex": re.escape(term)}}
+    term_grams = grams(term)
+    if term_grams:
+        text_match = {"search_grams": {"$all": sorted(term_grams)}, **text_match}
+
+    clauses = [text_match]
+    type_names = _types_matching(term)
+    if type_names:
+        # sort_keys.category is the stripped, lower-cased category (indexed), so
+        # "Laptop" / "laptop " assets both match, as the old regex filter did
+        clauses.append({"sort_keys.category": {"$in": sorted({n.strip().lower() for n in type_names})}})
+
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
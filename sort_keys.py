@@ -0,0 +1,76 @@
+#sort_keys.py
+"""
+Typed, write-time sort keys for the dashboard columns.
+
+Each asset stores `sort_keys` = {column: typed value}: dates as BSON dates,
+text lowercased. /filter_assets sorts on `sort_keys.<column>` (+ _id) in Mongo,
+backed by one compound index per column, so nothing is formatted and
+re-parsed at request time.
+"""
+from datetime import datetime, date
+
+# column -> (kind, source keys in priority order; labels cover older imports)
+SORTABLE_COLUMNS = {
+    "given_date": ("date", ("given_date", "Given Date")),
+    "purchase_date": ("date", ("purchase_date", "Date of Purchase")),
+    "category": ("text", ("category",)),
+    "status": ("text", ("status", "Status")),
+    "model": ("text", ("system_model", "model", "System Model", "Model")),
+}
+
+# Missing dates sort first ascending, like the old datetime.min fallback
+MISSING_DATE = datetime.min
+DATE_FORMATS = ("%d-%m-%Y", "%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y")
+
+
+def parse_sort_date(val):
+    if isinstance(val, datetime):
+        return val
+    if isinstance(val, date):
+        return datetime(val.year, val.month, val.day)
+    if not val:
+        return MISSING_DATE
+    s = str(val).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt)
+        except ValueError:
+            pass
+    return MISSING_DATE
+
+
+def _first_value(asset, keys):
+    for key in keys:
+        val = asset.get(key)
+        if val not in (None, "") and str(val).strip().lower() not in ("none", "null"):
+            return val
+    return None
+
+
+def build_sort_keys(asset):
+    keys = {}
+    for column, (kind, sources) in SORTABLE_COLUMNS.items():
+        val = _first_value(asset, sources)
+        if kind == "date":
+            keys[column] = parse_sort_date(val)
+        else:
+            keys[column] = str(val).strip().lower() if val is not None else ""
+    return keys
+
+
+def parse_sort_param(sort):
+    """
+    'given_date_desc' -> ('sort_keys.given_date', -1).
+    Unknown / empty -> ('_id', 1).
+    """
+    if not sort or "_" not in sort:
+        return "_id", 1
+    column, direction = sort.rsplit("_", 1)
+    if column not in SORTABLE_COLUMNS or direction not in ("asc", "desc"):
+        return "_id", 1
+    return f"sort_keys.{column}", -1 if direction == "desc" else 1
+
+
+def sort_index_specs():
+    """Index key lists for models.py (one per sortable column)."""
+    return [[(f"sort_keys.{column}", 1), ("_id", 1)] for column in SORTABLE_COLUMNS]
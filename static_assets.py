@@ -0,0 +1,155 @@
+#static_assets.py
+"""
+Fingerprinted static files.
+
+`python static_assets.py` (run by `npm run build` after rollup) copies the
+files in ASSET_SOURCES to static/dist/ as <name>.<hash>.<ext>, writes .gz and
+(with the optional `brotli` package) .br siblings for text files, and records
+logical name -> hashed path in static/dist/manifest.json:
+
+    {"style.css": "dist/style.3f2a9c1b0d.css", "bundle.js": "dist/bundle.81e0c4aa2f.js", ...}
+
+Templates call asset_url("style.css"); without a manifest (dev checkout) it
+falls back to the plain file. Hashed files never change, so serve_static()
+sends them with a one-year immutable Cache-Control and picks the .br / .gz
+variant the browser accepts.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are built/served without it
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+# logical name -> source file
+ASSET_SOURCES = {
+    "bundle.js": os.path.join(BASE_DIR, "public", "assets", "bundle.js"),
+    "style.css": os.path.join(STATIC_DIR, "style.css"),
+    "favicon.ico.png": os.path.join(STATIC_DIR, "favicon.ico.png"),
+    "kisnarbg2.png": os.path.join(STATIC_DIR, "kisnarbg2.png"),
+    "9.jpg": os.path.join(STATIC_DIR, "9.jpg"),
+}
+COMPRESSIBLE_EXTENSIONS = {".js", ".css", ".svg", ".json", ".map", ".txt"}
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# Path prefixes that never need the session (see extensions.enforce_session)
+STATIC_PATH_PREFIXES = ("/static/", "/assets/")
+
+_manifest = None
+
+
+# === 🏗️ BUILD ==================================================
+def fingerprint(path, length=10):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()[:length]
+
+
+def write_compressed_variants(path):
+    with open(path, "rb") as fh:
+        data = fh.read()
+    with open(path + ".gz", "wb") as fh:
+        fh.write(gzip.compress(data, compresslevel=9))
+    if brotli is not None:
+        with open(path + ".br", "wb") as fh:
+            fh.write(brotli.compress(data, quality=11))
+
+
+def build_manifest():
+    """Rebuild static/dist from ASSET_SOURCES and write the manifest. Returns it."""
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    os.makedirs(DIST_DIR)
+    manifest = {}
+    for name, source in ASSET_SOURCES.items():
+        if not os.path.exists(source):
+            print(f"⚠️ Skipping missing asset {source}")
+            continue
+        stem, ext = os.path.splitext(name)
+        hashed = f"{stem}.{fingerprint(source)}{ext}"
+        target = os.path.join(DIST_DIR, hashed)
+        shutil.copyfile(source, target)
+        if ext in COMPRESSIBLE_EXTENSIONS:
+            write_compressed_variants(target)
+        manifest[name] = f"dist/{hashed}"
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    print(f"✅ Fingerprinted {len(manifest)} assets into {DIST_DIR}")
+    return manifest
+
+
+# === 🔗 LOOKUP =================================================
+def load_manifest():
+    global _manifest
+    if _manifest is None or current_app.debug:
+        try:
+            with open(MANIFEST_PATH, encoding="utf-8") as fh:
+                _manifest = json.load(fh)
+        except (OSError, ValueError):
+            _manifest = {}
+    return _manifest
+
+
+def asset_url(name):
+    """URL of a static asset, fingerprinted when the manifest knows it."""
+    hashed = load_manifest().get(name)
+    if hashed:
+        return url_for("static", filename=hashed)
+    if name == "bundle.js":
+        return url_for("main.serve_assets", filename=name)
+    return url_for("static", filename=name)
+
+
+def is_static_path(path):
+    return path.startswith(STATIC_PATH_PREFIXES)
+
+
+# === 📦 SERVING ================================================
+def send_static(directory, filename):
+    """send_from_directory, with immutable caching + precompressed variants for dist/ files."""
+    if not filename.startswith("dist/"):
+        return send_from_directory(directory, filename)
+
+    accepted = request.accept_encodings
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        variant = safe_join(directory, filename + suffix)
+        if accepted[encoding] and variant and os.path.isfile(variant):
+            # mimetype from the original name, not the .br/.gz suffix
+            response = send_from_directory(directory, filename + suffix, mimetype=_mimetype(filename))
+            response.headers["Content-Encoding"] = encoding
+            break
+    else:
+        response = send_from_directory(directory, filename)
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def _mimetype(filename):
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def serve_static(filename):
+    return send_static(current_app.static_folder, filename)
+
+
+def init_static_assets(app):
+    app.view_functions["static"] = serve_static
+    app.jinja_env.globals["asset_url"] = asset_url
+
+
+if __name__ == "__main__":
+    build_manifest()
@@ -0,0 +1,26 @@
+#tests/conftest.py
+"""
+Most app modules import models.py, which connects to the local MongoDB and
+builds indexes at import time. Test modules that need those call
+require_mongo() before importing app code, so they skip (instead of hanging
+on server selection) when no server is running.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def require_mongo():
+    pymongo = pytest.importorskip("pymongo")
+    client = pymongo.MongoClient("mongodb://localhost:27017/", serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except pymongo.errors.PyMongoError:
+        pytest.skip("MongoDB is not running on localhost:27017", allow_module_level=True)
+    finally:
+        client.close()
@@ -0,0 +1,66 @@
+#tests/test_backup_store.py
+from datetime import datetime, timedelta
+
+from conftest import require_mongo
+
+require_mongo()
+
+import backups  # noqa: E402
+from backups import iter_chunks, retained_snapshots  # noqa: E402
+
+
+def _ids(chunks):
+    return {tuple(d["_id"] for d in chunk) for chunk in chunks}
+
+
+def test_chunks_are_deterministic(monkeypatch):
+    monkeypatch.setattr(backups, "CHUNK_DOCS", 10)
+    docs = [{"_id": i} for i in range(1000)]
+    assert _ids(iter_chunks(docs)) == _ids(iter_chunks(docs))
+
+
+def test_insert_only_changes_one_chunk(monkeypatch):
+    monkeypatch.setattr(backups, "CHUNK_DOCS", 10)
+    monkeypatch.setattr(backups, "MAX_CHUNK_DOCS", 10 ** 6)
+    before = [{"_id": i} for i in range(0, 2000, 2)]
+    after = sorted(before + [{"_id": 1001}], key=lambda d: d["_id"])
+    old, new = _ids(iter_chunks(before)), _ids(iter_chunks(after))
+    assert len(old - new) == 1
+    assert len(new - old) in (1, 2)  # 2 if the new doc is itself a boundary
+
+
+def test_chunks_are_capped(monkeypatch):
+    monkeypatch.setattr(backups, "CHUNK_DOCS", 10 ** 9)
+    monkeypatch.setattr(backups, "MAX_CHUNK_DOCS", 5)
+    chunks = list(iter_chunks([{"_id": i} for i in range(23)]))
+    assert max(len(c) for c in chunks) <= 5
+    assert sum(len(c) for c in chunks) == 23
+
+
+def _snapshot(snapshot_id, created, base=None):
+    return {"id": snapshot_id, "created_at": created.isoformat(), "base": base,
+            "type": "incremental" if base else "full"}
+
+
+def test_retention_keeps_newest_per_day_and_latest():
+    now = datetime(2024, 6, 10, 12)
+    snapshots = [
+        _snapshot("d1-early", now - timedelta(days=1, hours=6)),
+        _snapshot("d1-late", now - timedelta(days=1, hours=1)),
+        _snapshot("today", now - timedelta(hours=1)),
+    ]
+    keep = retained_snapshots(snapshots, now=now, keep_daily=7, keep_weekly=0)
+    assert keep == {"d1-late", "today"}
+
+
+def test_retention_drops_old_and_keeps_bases():
+    now = datetime(2024, 6, 10, 12)
+    snapshots = [
+        _snapshot("ancient", now - timedelta(days=400)),
+        _snapshot("full", now - timedelta(days=3)),
+        _snapshot("inc1", now - timedelta(days=3) + timedelta(hours=1), base="full"),
+        _snapshot("inc2", now - timedelta(hours=2), base="inc1"),
+    ]
+    keep = retained_snapshots(snapshots, now=now, keep_daily=1, keep_weekly=0)
+    assert "ancient" not in keep
+    assert keep == {"inc2", "inc1", "full"}
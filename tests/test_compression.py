@@ -0,0 +1,54 @@
+#tests/test_compression.py
+import gzip
+import re
+
+import pytest
+
+from conftest import require_mongo
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_wtf")
+require_mongo()
+
+import app as app_module  # noqa: E402
+from csrf_masking import mask_token, unmask_token  # noqa: E402
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app_module, "start_scheduler", lambda: None)
+    flask_app = app_module.create_app()
+    flask_app.config.update(TESTING=True)
+    client = flask_app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = "test"
+        session["username"] = "test"
+        session["role"] = "admin"
+    return client
+
+
+def _meta_token(html):
+    return re.search(r'<meta name="csrf-token" content="([^"]+)"', html).group(1)
+
+
+def test_dashboard_is_compressed(client):
+    response = client.get("/dashboard", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert b"csrf-token" in gzip.decompress(response.get_data())
+
+
+def test_csrf_token_is_masked_per_response(client):
+    first = client.get("/dashboard").get_data(as_text=True)
+    second = client.get("/dashboard").get_data(as_text=True)
+    a, b = _meta_token(first), _meta_token(second)
+    assert a != b
+    assert unmask_token(a) == unmask_token(b)
+
+
+def test_mask_round_trip_and_passthrough():
+    token = "ImFiYyI.ZqXyAA.c2lnbmF0dXJl"
+    assert unmask_token(mask_token(token)) == token
+    assert mask_token(token) != mask_token(token)
+    assert unmask_token(token) == token
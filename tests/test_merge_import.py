@@ -0,0 +1,68 @@
+#tests/test_merge_import.py
+from datetime import datetime
+
+import pytest
+
+from conftest import require_mongo
+
+pytest.importorskip("openpyxl")
+require_mongo()
+
+import importers  # noqa: E402
+from importers import asset_writes, preview_modes, write_error_message, IMPORT_MODE_INSERT, IMPORT_MODE_MERGE  # noqa: E402
+from natural_keys import build_content_hash  # noqa: E402
+from utils import merge_asset, with_derived_fields, DERIVED_FIELDS  # noqa: E402
+
+OLD = datetime(2024, 1, 1)
+
+
+def _stored():
+    doc = with_derived_fields({"category": "Laptop", "serial_no": "SN1", "status": "Spare", "remarks": "dock"})
+    doc.update(_id=7, updated_at=OLD)
+    return doc
+
+
+def _row(**fields):
+    return with_derived_fields({"category": "Laptop", "serial_no": "SN1", **fields})
+
+
+def test_merge_keeps_columns_missing_from_the_sheet():
+    merged = merge_asset(_stored(), _row(status="In use"))
+    assert merged["remarks"] == "dock" and merged["status"] == "In use"
+    content = {k: v for k, v in merged.items() if k not in DERIVED_FIELDS and k != "_id"}
+    assert merged["content_hash"] == build_content_hash(content)
+    assert "dock" in merged["search_text"]
+
+
+def test_merge_writes_only_changed_rows(monkeypatch):
+    stored = _stored()
+    monkeypatch.setattr(importers, "stored_by_natural_key", lambda assets: {stored["natural_key"]: stored})
+    unchanged_row = (_row(status="Spare"), ("Laptop", 2))
+    ops, origins, unchanged = asset_writes([unchanged_row], IMPORT_MODE_MERGE)
+    assert (ops, origins, unchanged) == ([], [], 1)
+
+    ops, origins, unchanged = asset_writes([(_row(status="In use"), ("Laptop", 3))], IMPORT_MODE_MERGE)
+    assert unchanged == 0 and origins == [("Laptop", 3)]
+    update = ops[0]._doc["$set"]
+    assert update["remarks"] == "dock" and update["updated_at"] > OLD
+    assert "_id" not in update
+
+
+def test_repeated_key_in_one_batch_merges_into_one_write(monkeypatch):
+    monkeypatch.setattr(importers, "stored_by_natural_key", lambda assets: {})
+    rows = [(_row(status="Spare"), ("Laptop", 2)), (_row(remarks="bag"), ("Laptop", 3))]
+    ops, origins, _ = asset_writes(rows, IMPORT_MODE_MERGE)
+    assert len(ops) == 1 and origins == [("Laptop", 3)]
+    assert ops[0]._doc["status"] == "Spare" and ops[0]._doc["remarks"] == "bag"
+
+
+def test_merge_is_the_default_and_only_mode_for_delta_previews():
+    assert preview_modes({"row_count": 3})[0] == IMPORT_MODE_MERGE
+    assert preview_modes({"row_count": 3, "skipped_unchanged": 0}) == (IMPORT_MODE_MERGE,)
+
+
+def test_duplicate_identifier_error_suggests_merge():
+    err = {"code": 11000, "errmsg": 'E11000 duplicate key error dup key: { natural_key: "laptop|serial_no|sn1" }'}
+    message = write_error_message(err, IMPORT_MODE_INSERT)
+    assert "'sn1' already exists" in message and "Merge" in message
+    assert write_error_message({"code": 2, "errmsg": "boom"}, IMPORT_MODE_INSERT) == "boom"
@@ -0,0 +1,47 @@
+#tests/test_migrations.py
+from datetime import datetime
+
+from conftest import require_mongo
+
+require_mongo()
+
+from migrations import _content  # noqa: E402
+from migrations import m0001_typed_storage as m0001  # noqa: E402
+from utils import DERIVED_FIELDS  # noqa: E402
+
+LEGACY_ASSET = {
+    "_id": 1,
+    "category": "Laptop",
+    "serial_no": "SN-001",
+    "given_date": "01-02-2024",
+    "amount": "1,200.50",
+    "gst_(18%)": "216",
+    "Remarks.old": "spare charger",
+}
+
+
+def test_m0001_converts_legacy_doc():
+    upgraded = m0001.transform(dict(LEGACY_ASSET))
+    assert upgraded is not None
+    assert isinstance(upgraded["given_date"], datetime)
+    assert "Remarks_old" in upgraded and "Remarks.old" not in upgraded
+    assert "content_hash" in upgraded and "sort_keys" in upgraded
+
+
+def test_m0001_is_a_no_op_on_converted_doc():
+    upgraded = m0001.transform(dict(LEGACY_ASSET))
+    assert m0001.transform(dict(upgraded)) is None
+
+
+def test_m0001_ignores_updated_at():
+    upgraded = m0001.transform(dict(LEGACY_ASSET))
+    upgraded["updated_at"] = datetime(2024, 3, 1)
+    assert m0001.transform(dict(upgraded)) is None
+
+
+def test_content_strips_derived_fields():
+    upgraded = m0001.transform(dict(LEGACY_ASSET))
+    upgraded["updated_at"] = datetime(2024, 3, 1)
+    content = _content(upgraded)
+    assert not DERIVED_FIELDS & set(content)
+    assert content["_id"] == 1
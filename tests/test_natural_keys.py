@@ -0,0 +1,48 @@
+#tests/test_natural_keys.py
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("bson")
+
+from natural_keys import build_natural_key, build_content_hash  # noqa: E402
+
+
+def test_natural_key_ignores_case_and_whitespace():
+    a = build_natural_key({"category": "Mobile", "imei1": " 35-ABC "})
+    b = build_natural_key({"category": " mobile", "imei1": "35-abc"})
+    assert a == b == "mobile|imei1|35-abc"
+
+
+def test_natural_key_reads_excel_floats_as_integers():
+    assert build_natural_key({"category": "Mobile", "imei1": 351234567890123.0}) == "mobile|imei1|351234567890123"
+
+
+def test_natural_key_falls_back_to_serial_no():
+    assert build_natural_key({"category": "Laptop", "serial_no": "SN1"}) == "laptop|serial_no|sn1"
+
+
+@pytest.mark.parametrize("asset", [
+    {"serial_no": "SN1"},
+    {"category": "Laptop"},
+    {"category": "Laptop", "serial_no": "N/A"},
+    {"category": "Laptop", "serial_no": "  "},
+])
+def test_natural_key_none_without_identifier(asset):
+    assert build_natural_key(asset) is None
+
+
+def test_content_hash_ignores_order_blanks_and_id():
+    a = {"_id": 1, "category": "Laptop", "serial_no": "SN1", "remarks": ""}
+    b = {"serial_no": "SN1", "category": "Laptop", "owner": None}
+    assert build_content_hash(a) == build_content_hash(b)
+
+
+def test_content_hash_matches_bson_millisecond_dates():
+    written = {"given_date": datetime(2024, 2, 1, 10, 0, 0, 123456)}
+    read_back = {"given_date": datetime(2024, 2, 1, 10, 0, 0, 123000)}
+    assert build_content_hash(written) == build_content_hash(read_back)
+
+
+def test_content_hash_changes_with_content():
+    assert build_content_hash({"status": "In use"}) != build_content_hash({"status": "Spare"})
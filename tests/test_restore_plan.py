@@ -0,0 +1,92 @@
+#tests/test_restore_plan.py
+import time
+from datetime import datetime
+
+import pytest
+
+from conftest import require_mongo
+
+require_mongo()
+
+import backups  # noqa: E402
+from backups import _collection_plan  # noqa: E402
+
+
+def _manifest(collections):
+    return {"collections": collections}
+
+
+def test_plan_replays_deltas_after_full():
+    full = {"mode": "full", "chunks": ["a"]}
+    delta1 = {"mode": "delta", "chunks": ["b"]}
+    delta2 = {"mode": "delta", "chunks": ["c"]}
+    chain = [_manifest({"assets": full}), _manifest({"assets": delta1}), _manifest({"assets": delta2})]
+    assert _collection_plan(chain, "assets") == [full, delta1, delta2]
+
+
+def test_plan_restarts_at_latest_full():
+    old = {"mode": "full", "chunks": ["a"]}
+    newer = {"mode": "full", "chunks": ["b"]}
+    chain = [_manifest({"users": old}), _manifest({"users": newer})]
+    assert _collection_plan(chain, "users") == [newer]
+
+
+def test_plan_skips_snapshots_without_collection():
+    full = {"mode": "full", "chunks": ["a"]}
+    chain = [_manifest({"assets": full}), _manifest({})]
+    assert _collection_plan(chain, "assets") == [full]
+    assert _collection_plan(chain, "users") == []
+
+
+def test_restore_forces_next_backup_full():
+    from backups import _choose_type
+    chain = [{"type": "full"}, {"type": "incremental"}]
+    assert _choose_type("auto", chain) == "incremental"
+    assert _choose_type("auto", chain, force_full=True) == "full"
+    assert _choose_type("incremental", chain, force_full=True) == "full"
+
+
+@pytest.fixture
+def scratch_backups(monkeypatch, tmp_path):
+    """backups.py pointed at a throwaway database and backup directory."""
+    import models
+    name = "ams_test_backups"
+    client = models.client
+    client.drop_database(name)
+    monkeypatch.setattr(backups, "db", client[name])
+    monkeypatch.setattr(backups, "DB_NAME", name)
+    monkeypatch.setattr(backups, "CHUNK_DIR", str(tmp_path / "chunks"))
+    monkeypatch.setattr(backups, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    yield client[name]
+    for db_name in client.list_database_names():
+        if db_name.startswith(name):
+            client.drop_database(db_name)
+
+
+def _backup(kind="auto"):
+    time.sleep(1.1)  # snapshot ids have one-second resolution
+    return backups.create_backup(kind)
+
+
+def test_restore_then_incremental_then_restore(scratch_backups):
+    assets = scratch_backups["assets"]
+    assets.insert_one({"_id": 1, "status": "v1", "updated_at": datetime.utcnow()})
+    first = _backup("full")
+
+    time.sleep(0.01)
+    assets.update_one({"_id": 1}, {"$set": {"status": "v2", "updated_at": datetime.utcnow()}})
+    second = _backup()
+    assert second["type"] == "incremental"
+
+    backups.restore_snapshot(first["id"])
+    assert scratch_backups["assets"].find_one({"_id": 1})["status"] == "v1"
+
+    # The restored doc is older than `second`; a delta on top of it would miss it
+    third = _backup()
+    assert third["type"] == "full"
+    assert scratch_backups["app_meta"].find_one({"_id": backups.FORCE_FULL_ID}) is None
+    fourth = _backup()
+    assert fourth["type"] == "incremental" and fourth["base"] == third["id"]
+
+    backups.restore_snapshot(fourth["id"])
+    assert scratch_backups["assets"].find_one({"_id": 1})["status"] == "v1"
@@ -0,0 +1,28 @@
+#tests/test_updated_at.py
+from datetime import datetime
+
+from conftest import require_mongo
+
+require_mongo()
+
+from utils import stamp_updated  # noqa: E402
+
+OLD = datetime(2024, 1, 1)
+
+
+def test_new_doc_is_stamped():
+    asset = stamp_updated({"content_hash": "a"})
+    assert asset["updated_at"] > OLD
+
+
+def test_unchanged_content_keeps_updated_at():
+    previous = {"content_hash": "a", "updated_at": OLD}
+    asset = stamp_updated({"content_hash": "a", "updated_at": OLD}, previous=previous)
+    assert asset["updated_at"] == OLD
+
+
+def test_changed_content_bumps_updated_at():
+    previous = {"content_hash": "a", "updated_at": OLD}
+    asset = stamp_updated({"content_hash": "b", "updated_at": OLD}, previous=previous)
+    assert asset["updated_at"] > OLD
+
@@ -0,0 +1,103 @@
+#type_registry.py
+"""
+In-process cache of asset type schemas.
+
+Types are keyed by case-folded `type_name`. A version stamp lives in Mongo
+(`app_meta`, _id="asset_types_version"); any write to asset_types must call
+bump_types_version() so every worker reloads on its next check instead of
+querying asset_types per request / per row.
+"""
+import copy
+import threading
+import time
+
+from models import asset_types_collection, app_meta_collection
+
+VERSION_KEY = "asset_types_version"
+# How often (seconds) a worker re-reads the version stamp
+VERSION_CHECK_INTERVAL = 2.0
+
+_lock = threading.Lock()
+_state = {
+    "version": None,
+    "checked_at": 0.0,
+    "types": {},   # casefolded type_name -> asset type doc
+}
+
+
+def _type_key(type_name):
+    return str(type_name or "").strip().casefold()
+
+
+def _read_version():
+    doc = app_meta_collection.find_one({"_id": VERSION_KEY}, {"version": 1})
+    return doc.get("version", 0) if doc else 0
+
+
+def _ensure_fresh():
+    now = time.monotonic()
+    if now - _state["checked_at"] < VERSION_CHECK_INTERVAL and _state["version"] is not None:
+        return
+
+    with _lock:
+        if now - _state["checked_at"] < VERSION_CHECK_INTERVAL and _state["version"] is not None:
+            return
+        version = _read_version()
+        if version != _state["version"]:
+            types = {}
+            for doc in asset_types_collection.find({}, {"type_name": 1, "fields": 1}):
+                key = _type_key(doc.get("type_name"))
+                # First one wins if two types only differ by case
+                types.setdefault(key, doc)
+            _state["types"] = types
+            _state["version"] = version
+        _state["checked_at"] = time.monotonic()
+
+
+def invalidate():
+    """Force a reload on the next lookup in this process."""
+    with _lock:
+        _state["version"] = None
+        _state["checked_at"] = 0.0
+
+
+def bump_types_version():
+    """Call after any insert/update on asset_types so all workers refresh."""
+    app_meta_collection.update_one({"_id": VERSION_KEY}, {"$inc": {"version": 1}}, upsert=True)
+    invalidate()
+
+
+def get_asset_type(type_name):
+    """Return a copy of the asset type doc (safe to mutate) or None."""
+    _ensure_fresh()
+    doc = _state["types"].get(_type_key(type_name))
+    return copy.deepcopy(doc) if doc else None
+
+
+def get_type_fields(type_name):
+    doc = get_asset_type(type_name)
+    return doc["fields"] if doc and "fields" in doc else None
+
+
+def has_type(type_name):
+    _ensure_fresh()
+    return _type_key(type_name) in _state["types"]
+
+
+def resolve_type_name(category):
+    """Canonical type_name for a stored category (falls back to the category itself)."""
+    _ensure_fresh()
+    doc = _state["types"].get(_type_key(category))
+    return doc.get("type_name", category) if doc else category
+
+
+def get_type_labels(type_name):
+    """Field labels for a type, without copying the cached schema."""
+    _ensure_fresh()
+    doc = _state["types"].get(_type_key(type_name))
+    return [f.get("label", "") for f in doc.get("fields", [])] if doc else []
+
+
+def list_type_names():
+    _ensure_fresh()
+    return sorted(doc["type_name"] for doc in _state["types"].values() if doc.get("type_name"))
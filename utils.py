@@ -1,7 +1,17 @@
 #utils.py
-from models import asset_types_collection
-from bson import ObjectId
-from datetime import datetime
+from type_registry import list_type_names, get_type_fields
+from search_index import build_search_fields, SEARCH_FIELDS
+from sort_keys import build_sort_keys
+from natural_keys import build_natural_key, build_content_hash
+from parsing import to_bson_date
+from pymongo import UpdateOne
+from bson import json_util
+from bson.decimal128 import Decimal128
+from datetime import datetime, date
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+import re
+from types import MappingProxyType
+import base64
 
 #def serialize_asset(asset):
 #    def safe(val):
@@ -12,6 +22,58 @@ from datetime import datetime
 #        return val
 #
 #    return {k: safe(v) for k, v in asset.items()}
+# Keys maintained by the app itself; never shown, exported or edited as asset fields
+INTERNAL_FIELDS = frozenset({"_id", "sort_keys", "natural_key", "content_hash", "updated_at", *SEARCH_FIELDS})
+DERIVED_FIELDS = INTERNAL_FIELDS - {"_id"}
+
+def derived_fields(asset):
+    """Write-time derived fields (search index, typed sort keys, identity) for a full asset doc."""
+    source = {k: v for k, v in asset.items() if k not in DERIVED_FIELDS}
+    fields = build_search_fields(source)
+    fields["sort_keys"] = build_sort_keys(source)
+    fields["natural_key"] = build_natural_key(source)
+    fields["content_hash"] = build_content_hash(source)
+    return fields
+
+def with_derived_fields(asset):
+    asset.update(derived_fields(asset))
+    return asset
+
+def stamp_updated(asset, previous=None):
+    """
+    Set updated_at when the content hash differs from the stored doc's
+    (always for new docs). Incremental backups pick assets up by it, so
+    rewrites that change nothing must leave it alone.
+    """
+    if previous is None or previous.get("content_hash") != asset.get("content_hash"):
+        asset["updated_at"] = datetime.utcnow()
+    return asset
+
+def merge_asset(stored, changes):
+    """
+    `changes` laid over the stored doc's content, with derived fields rebuilt
+    from the merged result (as edit_asset does), so keys the changes do not
+    mention stay searchable / sortable and content_hash covers the whole doc.
+    """
+    merged = {k: v for k, v in (stored or {}).items() if k not in DERIVED_FIELDS}
+    merged.update({k: v for k, v in changes.items() if k not in DERIVED_FIELDS})
+    return with_derived_fields(merged)
+
+def rebuild_derived_fields(collection, batch_size=1000):
+    """Backfill / refresh derived fields for every asset. Returns the number of docs touched."""
+    ops = []
+    updated = 0
+    for asset in collection.find({}, {f: 0 for f in DERIVED_FIELDS}).batch_size(batch_size):
+        ops.append(UpdateOne({"_id": asset["_id"]}, {"$set": derived_fields(asset)}))
+        if len(ops) >= batch_size:
+            collection.bulk_write(ops, ordered=False)
+            updated += len(ops)
+            ops = []
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+        updated += len(ops)
+    return updated
+
 def normalize_cell(val):
     if isinstance(val, datetime):
         return val.strftime("%Y-%m-%d")
@@ -19,7 +81,7 @@ def normalize_cell(val):
 
 def get_date_fields(schema=None):
     if schema is None:
-        schema = get_master_fields()
+        return list(MASTER_SCHEMA.by_type.get("date", ()))
     return [f["name"] for f in schema if f["type"] == "date"]
 
 def is_valid_date(val):
@@ -40,7 +102,7 @@ def is_valid_year(val):
 
 def get_field_type(name, schema=None):
     if schema is None:
-        schema = get_master_fields()
+        return MASTER_SCHEMA.type_of(name)
     for f in schema:
         if f["name"] == name:
             return f["type"]
@@ -51,8 +113,7 @@ def matches_search(asset, search_term):
         return True
 
     search_term = search_term.lower()
-    for field in get_master_fields():
-        name = field["name"]
+    for name in MASTER_SCHEMA.names:
         value = asset.get(name)
         if isinstance(value, (str, int, float)) and search_term in str(value).lower():
             return True
@@ -72,81 +133,132 @@ def normalize_imported_asset(asset):
     Maps imported asset keys/labels to DB field names using master fields.
     Ensures all master fields exist in the returned dict.
     """
-    # Build a mapping from label → name from master fields
-    label_to_name = {f["label"]: f["name"] for f in get_master_fields()}
-
     normalized = {}
-    for field in get_master_fields():
-        name = field["name"]
+    for name, label in MASTER_SCHEMA.name_to_label.items():
         # Check if asset has the key directly, else try matching by label
-        normalized[name] = asset.get(name) or asset.get(next((lbl for lbl, n in label_to_name.items() if n == name), ""), "")
-    
+        normalized[name] = asset.get(name) or asset.get(label, "")
+
     return normalized
 
 def get_all_existing_types():
-    return sorted(
-        [doc["type_name"] for doc in asset_types_collection.find({}, {"type_name": 1})]
-    )
+    return list_type_names()
 
 def get_fields_for_type(asset_type):
-    doc = asset_types_collection.find_one({"type_name": asset_type})
-    return doc["fields"] if doc and "fields" in doc else None
+    return get_type_fields(asset_type)
 
 def get_asset_statuses():
-    return ["Available(p)", "Available(g)", "Assigned(p)", "Assigned(g)", "Repair/Faulty", "Discard"]
+    return list(ASSET_STATUSES)
 
 def get_master_fields():
-    return[
-        {"label": "Previous Owner", "name": "prev_owner", "type": "text"},
-        {"label": "Username", "name": "username", "type": "text"},
-        {"label": "Previous User Code", "name": "prev_user_code", "type": "text"},
-        {"label": "User Code", "name": "user_code", "type": "text"},
-        {"label": "Area of Collection", "name": "area_of_collection", "type": "text"},
-        {"label": "Area", "name": "area", "type": "text"},
-        {"label": "State", "name": "state", "type": "select", "options": get_indian_states()},  # 👈 state
-        {"label": "Amount", "name": "amount", "type": "number"},
-        {"label": "GST (18%)", "name": "gst_18", "type": "number"},
-        {"label": "GST (22%)", "name": "gst_22", "type": "number"},
-        {"label": "GST (28%)", "name": "gst_28", "type": "number"}, 
-        {"label": "Total", "name": "total", "type": "number"},
-        {"label": "Date of Purchase", "name": "purchase_date", "type": "date"},
-        {"label": "Previous Given Date", "name": "prev_given_date", "type": "date"},
-        {"label": "Given Date", "name": "given_date", "type": "date"},
-        {"label": "Collected Date", "name": "collected_date", "type": "date"},
-        {"label": "Year", "name": "year", "type": "text"},
-        {"label": "Status", "name": "status", "type": "select", "options": get_asset_statuses()},
-        {"label": "Remarks", "name": "remarks", "type": "text"},
-        {"label": "Invoice No.", "name": "invoice_no", "type": "text"},
-        {"label": "Vendor", "name": "vendor", "type": "datalist", "options": []},
-        {"label": "License", "name": "license", "type": "text"},
-        {"label": "MTR Asset Tag", "name": "mtr_asset_tag", "type": "text"},
-        {"label": "Asset Tag", "name": "asset_tag", "type": "text"},
-        {"label": "Serial No.", "name": "serial_no", "type": "text"},
-        {"label": "OS", "name": "os", "type": "datalist", "options": []},
-        {"label": "Model", "name": "model", "type": "datalist", "options": []},
-        {"label": "System Manufacturer", "name": "system_manufacturer", "type": "datalist", "options": []},        
-        {"label": "Domain", "name": "domain", "type": "text"},
-        {"label": "IP Address", "name": "ip_address", "type": "text"},
-        {"label": "Processor", "name": "processor", "type": "text"},
-        {"label": "RAM", "name": "ram", "type": "text"},
-        {"label": "Courier by", "name": "courier_by", "type": "text"},
-        {"label": "HDD Size", "name": "hdd", "type": "text"},
-        {"label": "Free Space", "name": "free_space", "type": "text"},
-        {"label": "Endpoint Name", "name": "endpoint_name", "type": "text"},
-        {"label": "Received on Approval", "name": "received_on_approval", "type": "text"}
-    ]
+    """Fresh, mutable copy of the master field list (safe to edit / jsonify)."""
+    return MASTER_SCHEMA.as_list()
+
+INDIAN_STATES = (
+    "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh",
+    "Goa", "Gujarat", "Haryana", "Himachal Pradesh", "Jharkhand",
+    "Karnataka", "Kerala", "Madhya Pradesh", "Maharashtra", "Manipur",
+    "Meghalaya", "Mizoram", "Nagaland", "Odisha", "Punjab",
+    "Rajasthan", "Sikkim", "Tamil Nadu", "Telangana", "Tripura",
+    "Uttar Pradesh", "Uttarakhand", "West Bengal",
+    "Andaman and Nicobar Islands", "Chandigarh", "Dadra and Nagar Haveli and Daman and Diu",
+    "Delhi", "Jammu and Kashmir", "Ladakh", "Lakshadweep", "Puducherry"
+)
+
+ASSET_STATUSES = ("Available(p)", "Available(g)", "Assigned(p)", "Assigned(g)", "Repair/Faulty", "Discard")
 
 def get_indian_states():
-    return [
-        "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh",
-        "Goa", "Gujarat", "Haryana", "Himachal Pradesh", "Jharkhand",
-        "Karnataka", "Kerala", "Madhya Pradesh", "Maharashtra", "Manipur",
-        "Meghalaya", "Mizoram", "Nagaland", "Odisha", "Punjab",
-        "Rajasthan", "Sikkim", "Tamil Nadu", "Telangana", "Tripura",
-        "Uttar Pradesh", "Uttarakhand", "West Bengal",
-        "Andaman and Nicobar Islands", "Chandigarh", "Dadra and Nagar Haveli and Daman and Diu",
-        "Delhi", "Jammu and Kashmir", "Ladakh", "Lakshadweep", "Puducherry"
-    ]
+    return list(INDIAN_STATES)
+
+# --- Master field schema (built once at import) ---
+MASTER_FIELD_DEFS = (
+    {"label": "Previous Owner", "name": "prev_owner", "type": "text"},
+    {"label": "Username", "name": "username", "type": "text"},
+    {"label": "Previous User Code", "name": "prev_user_code", "type": "text"},
+    {"label": "User Code", "name": "user_code", "type": "text"},
+    {"label": "Area of Collection", "name": "area_of_collection", "type": "text"},
+    {"label": "Area", "name": "area", "type": "text"},
+    {"label": "State", "name": "state", "type": "select", "options": INDIAN_STATES},  # 👈 state
+    {"label": "Amount", "name": "amount", "type": "number"},
+    {"label": "GST (18%)", "name": "gst_18", "type": "number"},
+    {"label": "GST (22%)", "name": "gst_22", "type": "number"},
+    {"label": "GST (28%)", "name": "gst_28", "type": "number"},
+    {"label": "Total", "name": "total", "type": "number"},
+    {"label": "Date of Purchase", "name": "purchase_date", "type": "date"},
+    {"label": "Previous Given Date", "name": "prev_given_date", "type": "date"},
+    {"label": "Given Date", "name": "given_date", "type": "date"},
+    {"label": "Collected Date", "name": "collected_date", "type": "date"},
+    {"label": "Year", "name": "year", "type": "text"},
+    {"label": "Status", "name": "status", "type": "select", "options": ASSET_STATUSES},
+    {"label": "Remarks", "name": "remarks", "type": "text"},
+    {"label": "Invoice No.", "name": "invoice_no", "type": "text"},
+    {"label": "Vendor", "name": "vendor", "type": "datalist", "options": ()},
+    {"label": "License", "name": "license", "type": "text"},
+    {"label": "MTR Asset Tag", "name": "mtr_asset_tag", "type": "text"},
+    {"label": "Asset Tag", "name": "asset_tag", "type": "text"},
+    {"label": "Serial No.", "name": "serial_no", "type": "text"},
+    {"label": "OS", "name": "os", "type": "datalist", "options": ()},
+    {"label": "Model", "name": "model", "type": "datalist", "options": ()},
+    {"label": "System Manufacturer", "name": "system_manufacturer", "type": "datalist", "options": ()},
+    {"label": "Domain", "name": "domain", "type": "text"},
+    {"label": "IP Address", "name": "ip_address", "type": "text"},
+    {"label": "Processor", "name": "processor", "type": "text"},
+    {"label": "RAM", "name": "ram", "type": "text"},
+    {"label": "Courier by", "name": "courier_by", "type": "text"},
+    {"label": "HDD Size", "name": "hdd", "type": "text"},
+    {"label": "Free Space", "name": "free_space", "type": "text"},
+    {"label": "Endpoint Name", "name": "endpoint_name", "type": "text"},
+    {"label": "Received on Approval", "name": "received_on_approval", "type": "text"}
+)
+
+def is_currency_name(name):
+    return name in ("amount", "total") or name.startswith("gst_")
+
+class FieldSchema:
+    """
+    Immutable, precompiled view over a list of field definitions.
+    All lookups (by name, label, type) are dict/frozenset based.
+    """
+
+    def __init__(self, field_defs):
+        fields = []
+        for f in field_defs:
+            f = dict(f)
+            if "options" in f:
+                f["options"] = tuple(f["options"])
+            fields.append(MappingProxyType(f))
+        self.fields = tuple(fields)
+        self.names = tuple(f["name"] for f in self.fields)
+        self.by_name = MappingProxyType({f["name"]: f for f in self.fields})
+        self.by_label = MappingProxyType({f["label"]: f for f in self.fields})
+        self.label_to_name = MappingProxyType({f["label"]: f["name"] for f in self.fields})
+        self.name_to_label = MappingProxyType({f["name"]: f["label"] for f in self.fields})
+
+        by_type = {}
+        for f in self.fields:
+            by_type.setdefault(f["type"], []).append(f["name"])
+        self.by_type = MappingProxyType({t: tuple(names) for t, names in by_type.items()})
+
+        self.date_fields = frozenset(self.by_type.get("date", ()))
+        self.number_fields = frozenset(self.by_type.get("number", ()))
+        self.currency_fields = frozenset(n for n in self.number_fields if is_currency_name(n))
+
+    def type_of(self, name):
+        f = self.by_name.get(name)
+        return f["type"] if f else None
+
+    def label_of(self, name):
+        return self.name_to_label.get(name)
+
+    def as_list(self):
+        out = []
+        for f in self.fields:
+            f = dict(f)
+            if "options" in f:
+                f["options"] = list(f["options"])
+            out.append(f)
+        return out
+
+MASTER_SCHEMA = FieldSchema(MASTER_FIELD_DEFS)
 
 def filter_form_fields(form_data, allowed_fields):
     """
@@ -160,3 +272,172 @@ def fill_missing_asset_fields(data):
     enriched.setdefault('remarks', '')
     enriched.setdefault('status', 'available')
     return enriched
+
+
+# --- Keyset pagination helpers ---
+def encode_cursor(values):
+    """Encode a list of sort values (e.g. [sort_value, _id]) into a URL-safe token."""
+    raw = json_util.dumps(values).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(token):
+    """Inverse of encode_cursor. Returns None for missing or tampered tokens."""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return values if isinstance(values, list) and values else None
+    except Exception:
+        return None
+
+def _get_path(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+def _cursor_values(doc, sort_field):
+    if sort_field == "_id":
+        return [doc["_id"]]
+    return [_get_path(doc, sort_field), doc["_id"]]
+
+def _range_filter(values, sort_field, op):
+    """
+    Rows strictly after (value, last_id) in scan order. Mongo sorts null/missing
+    before every typed value, but `$gt`/`$lt` never match across types, so the
+    null group (docs without sort_keys yet) is spelled out explicitly.
+    """
+    if sort_field == "_id":
+        return {"_id": {op: values[0]}}
+    value, last_id = values
+    if value is None:
+        if op == "$gt":  # ascending: rest of the null group, then every typed value
+            return {"$or": [{sort_field: None, "_id": {op: last_id}}, {sort_field: {"$ne": None}}]}
+        return {sort_field: None, "_id": {op: last_id}}  # descending: nulls come last
+    clauses = [
+        {sort_field: {op: value}},
+        {sort_field: value, "_id": {op: last_id}},
+    ]
+    if op == "$lt":
+        clauses.append({sort_field: None})
+    return {"$or": clauses}
+
+def keyset_page(collection, query=None, sort_field="_id", direction=1, limit=25,
+                after=None, before=None, projection=None):
+    """
+    Fetch one page of `collection` ordered by (sort_field, _id) without skip().
+    `after` / `before` are cursor tokens taken from a previous page.
+    Returns {"items", "next_cursor", "prev_cursor"}.
+    """
+    query = dict(query or {})
+    after_values = decode_cursor(after)
+    before_values = decode_cursor(before)
+    backwards = before_values is not None and after_values is None
+
+    # Walking backwards = querying in the opposite order, then flipping the page
+    scan_direction = -direction if backwards else direction
+    op = "$gt" if scan_direction == 1 else "$lt"
+    boundary = before_values if backwards else after_values
+    if boundary is not None:
+        expected = 1 if sort_field == "_id" else 2
+        if len(boundary) == expected:
+            query = {"$and": [query, _range_filter(boundary, sort_field, op)]} if query else _range_filter(boundary, sort_field, op)
+
+    sort = [("_id", scan_direction)] if sort_field == "_id" else [(sort_field, scan_direction), ("_id", scan_direction)]
+    docs = list(collection.find(query, projection).sort(sort).limit(limit + 1))
+
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if backwards:
+        docs.reverse()
+
+    next_cursor = prev_cursor = None
+    if docs:
+        first = encode_cursor(_cursor_values(docs[0], sort_field))
+        last = encode_cursor(_cursor_values(docs[-1], sort_field))
+        if backwards:
+            prev_cursor = first if has_more else None
+            next_cursor = last
+        else:
+            next_cursor = last if has_more else None
+            prev_cursor = first if boundary is not None else None
+
+    return {"items": docs, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+
+
+# --- Typed storage: BSON dates + Decimal128 money ---
+def parse_ddmmyyyy_to_date(val):
+    try:
+        return datetime.strptime(val.strip(), "%d-%m-%Y") if val else None
+    except Exception:
+        return None
+
+def normalize_gst_keys(asset: dict) -> dict:
+    """
+    Ensure GST keys follow format: gst_22 (instead of gst_(22%) or gst22)
+    """
+    normalized = {}
+    for key, value in asset.items():
+        key_str = str(key)
+        if key_str.lower().startswith("gst"):
+            # Extract digits from key
+            match = re.search(r"(\d+)", key_str)
+            if match:
+                new_key = f"gst_{match.group(1)}"
+                normalized[new_key] = value
+            else:
+                normalized[key] = value
+        else:
+            normalized[key] = value
+    return normalized
+
+DISPLAY_DATE_FORMAT = "%d-%m-%Y"
+MONEY_QUANTUM = Decimal("0.01")
+
+def to_money(val):
+    """Coerce '₹1,23,456.78' / 1234.5 / Decimal128 to Decimal128 (paise precision). Blank -> None."""
+    if isinstance(val, Decimal128):
+        return val
+    if val is None:
+        return None
+    s = str(val).replace("₹", "").replace(",", "").strip()
+    if s == "" or s.lower() == "none":
+        return None
+    try:
+        return Decimal128(Decimal(s).quantize(MONEY_QUANTUM, rounding=ROUND_HALF_UP))
+    except (InvalidOperation, ValueError):
+        return None
+
+def format_date(val):
+    """dd-mm-YYYY for stored dates; other values pass through as strings."""
+    if isinstance(val, (datetime, date)):
+        return val.strftime(DISPLAY_DATE_FORMAT)
+    return "" if val is None else str(val)
+
+def is_date_field(name, schema_fields=None):
+    if name in MASTER_SCHEMA.date_fields:
+        return True
+    if schema_fields:
+        return any(f.get("name") == name and f.get("type") == "date" for f in schema_fields)
+    return False
+
+def coerce_asset_types(asset, schema_fields=None):
+    """
+    Convert an asset payload to its storage types in place:
+    date fields -> datetime, amount/total/gst_* -> Decimal128.
+    Used at every write boundary (create, edit, import, migration).
+    """
+    date_names = set(MASTER_SCHEMA.date_fields)
+    if schema_fields:
+        date_names.update(f.get("name") for f in schema_fields if f.get("type") == "date")
+
+    for key, value in list(asset.items()):
+        if not isinstance(key, str):
+            continue
+        if key in date_names:
+            asset[key] = to_bson_date(value)
+        elif is_currency_name(key):
+            asset[key] = to_money(value)
+    return asset